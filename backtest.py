@@ -0,0 +1,52 @@
+import argparse
+import os
+import time
+import config
+import logging
+from golfsim import db_tools, backtest_tools
+
+log = logging.getLogger(__name__)
+if config.debug:
+    level = logging.WARNING
+    filename = ''
+    if config.verbose:
+        level = logging.INFO
+    if config.to_file:
+        filename = config.log_filename
+    logging.basicConfig(filename=filename, level=level)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay past Sim_Tournaments and score the predictions')
+    parser.add_argument('--since', type=int, help='first start date, YYYYMMDD')
+    parser.add_argument('--until', type=int, help='last start date, YYYYMMDD')
+    parser.add_argument('--workers', type=int, default=config.backtestWorkers)
+    parser.add_argument('--num-sims', type=int, default=config.backtestNumSims)
+    args = parser.parse_args()
+
+    params = {
+        'num_sims': args.num_sims,
+        'num_rounds': config.num_rounds,
+        'max_round_age': config.max_round_age,
+        'decayFunc': config.decayFunction.__name__,
+        'decayArgs': [config.decayExp, config.decayOffset],
+        'min_rounds': config.min_rounds,
+        'seed': config.seed,
+        # Tournaments run in parallel processes, so each sim gets a share of the cores
+        'threads': max(1, (os.cpu_count() or 1) // (args.workers or os.cpu_count() or 1))
+    }
+
+    db = db_tools.DB_Interface(config.db_filename)
+    events = backtest_tools.get_events(db, args.since, args.until)
+    log.info(f'Backtesting {len(events)} tournaments...')
+    t = time.perf_counter()
+    predictions = backtest_tools.run_backtest(config.db_filename, events, params, args.workers)
+    log.info(f'Backtesting {len(events)} tournaments complete ({time.perf_counter() - t}s)')
+
+    predictions.to_csv(config.backtest_filename, index=False)
+    print(backtest_tools.score_predictions(predictions))
+    print(backtest_tools.calibration_table(predictions))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import config
+from golfsim import sim, bench_tools
+
+parser = argparse.ArgumentParser()
+subparsers = parser.add_subparsers(dest='command', required=True)
+
+ranking = subparsers.add_parser('ranking', help='compare the ranking kernel with the reference implementation')
+ranking.add_argument('--field-sizes', type=int, nargs='+', default=[70, 156, 240])
+ranking.add_argument('--tournaments', type=int, default=2000)
+ranking.add_argument('--seed', type=int, default=0)
+
+suite = subparsers.add_parser('suite', help='time every hot path on a synthetic database')
+suite.add_argument('--field-sizes', type=int, nargs='+', default=[70, 156, 240])
+suite.add_argument('--sims', type=int, nargs='+', default=[10000, 100000])
+suite.add_argument('--rounds-per-player', type=int, default=200)
+suite.add_argument('--courses', type=int, default=40)
+suite.add_argument('--repeat', type=int, default=3)
+suite.add_argument('--seed', type=int, default=0)
+suite.add_argument('--dir', default=config.bench_dir, help='where the synthetic databases are written')
+suite.add_argument('--output', default=config.bench_filename, help='JSON results file')
+suite.add_argument('--baseline', help='JSON results file to compare against')
+suite.add_argument('--tolerance', type=float, default=bench_tools.default_tolerance)
+args = parser.parse_args()
+
+if args.command == 'ranking':
+    print('Tournament ranking, ns per tournament')
+    print(f'{"field":>6} {"reference":>12} {"kernel":>12} {"speedup":>8}')
+    for field_size, reference_ns, kernel_ns in sim.bench_ranking(args.field_sizes, args.tournaments, 4, 2, 65, args.seed):
+        print(f'{field_size:>6} {reference_ns:>12.0f} {kernel_ns:>12.0f} {reference_ns / kernel_ns:>7.1f}x')
+else:
+    results = bench_tools.run_suite(args.dir, args.field_sizes, args.sims, args.rounds_per_player, args.courses,
+                                    config.max_round_age, config.decayFunction, config.decayExp, config.decayOffset,
+                                    seed=args.seed, repeat=args.repeat)
+    bench_tools.write_results(args.output, results, vars(args))
+    print(f'{"name":<24} {"field":>6} {"sims":>8} {"seconds":>10}')
+    for r in results:
+        print(f'{r["name"]:<24} {r["field_size"]:>6} {r["num_sims"] or "":>8} {r["seconds"]:>10.4f}')
+
+    if args.baseline is not None:
+        df = bench_tools.compare(results, bench_tools.read_results(args.baseline), args.tolerance)
+        regressions = df[df['regression']]
+        print(f'\n{len(regressions)} regressions against {args.baseline} (tolerance {args.tolerance:.0%})')
+        for r in regressions.to_dict('records'):
+            print(f'{r["name"]:<24} {r["field_size"]:>6} {r["num_sims"] or "":>8} '
+                  f'{r["seconds_baseline"]:>10.4f} -> {r["seconds"]:.4f} ({r["ratio"]:.2f}x)')
+        if len(regressions) > 0:
+            exit(1)
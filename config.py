@@ -10,21 +10,72 @@ cut_round = 4
 
 # Sim config
 max_round_age = 730
-num_sims = 100000
+num_sims = 100000  # Upper bound when sim_tolerance is set
+sim_tolerance = None  # Stop early once every win/top N/made cut standard error is below this, e.g. 0.001
+sim_batch_size = 10000
+track_positions = False  # Record every finishing position to price placement markets
+track_matchups = False  # Head to head counts between every pair in the field
+matchup_groups = []  # 2 and 3 balls to price, as lists of dg_ids e.g. [[18417, 10091, 22085]]
 num_rounds = 4
 decayFunction = utils.inverseAgeDecay
 decayExp = 1/1.01
 decayOffset = 100
 min_rounds = 25
+seed = None  # Set to an int to reproduce a previous run, the seed used is logged
+store_runs = False  # Save every finishing position of each run to runs_dir, 2 bytes per player and tournament
+
+# Live config
+live_num_sims = 20000
+live_refresh = 60  # seconds between live updates, None to update once
+
+# Service config, see service.py
+service_host = '127.0.0.1'  # local only
+service_port = 8765
+service_num_sims = 100000
+
+# Sweep config, every combination of these values is simulated. Keys other than max_round_age, min_rounds,
+# cut_round and cut_line are passed to decayFunction in this order.
+sweep_num_sims = 20000
+sweep_grid = {
+    'max_round_age': [365, 730],
+    'decayExp': [1/1.01, 1/2],
+    'decayOffset': [50, 100],
+    'min_rounds': [25]
+}
+
+# Backtest config
+backtestNumSims = 10000
+backtestWorkers = None  # processes, None for one per core
 
 # File paths
 db_filename = os.path.join('local', 'golfmodel.db')
+cache_dir = os.path.join('local', 'cache')
+sweep_filename = os.path.join('local', 'sweep.csv')
+backtest_filename = os.path.join('local', 'backtest.csv')
+bench_dir = os.path.join('local', 'bench')
+bench_filename = os.path.join('local', 'bench.json')
+trace_dir = os.path.join('local', 'trace')
+runs_dir = os.path.join('local', 'runs')
+archive_dir = os.path.join('local', 'archive')
+
+# Cache config
+offline = False  # Serve every request from cache_dir, never touch the network
 
 # Update config
-updateWaitTime = 5
+updateRate = 0.2  # player profile requests per second
+updateBurst = 1
+updateWorkers = 4
+updateMaxRetries = 3
+updateBackoff = 5  # seconds, doubled after each failed attempt
+updateScheduleTour = 'all'  # Tours whose events can add rounds to a player's profile
+updateIngestBatch = 25  # profiles written to the database per transaction
+updateMaxSyncAge = 14  # days before a profile is refetched even if no event was played
+updateArchive = True  # Keep every raw profile response in archive_dir, see reingest.py
+reingestWorkers = None  # processes, None for one per core
 
 # Debug config
 debug = True
+trace = False  # Time spans and count HTTP requests, SQL rows and tournaments into trace_dir, see trace_tools
 verbose = True
 to_file = False
 log_filename = 'logs/debug.txt'
\ No newline at end of file
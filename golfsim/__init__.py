@@ -1,6 +1,16 @@
 from . import utils
+from . import trace_tools
+from . import cache_tools
 from . import db_tools
 from . import dg_tools
 from . import pga_tools
+from . import fetch_tools
+from . import archive_tools
+from . import market_tools
+from . import store_tools
+from . import sweep_tools
+from . import backtest_tools
+from . import bench_tools
+from . import service_tools
 import sim
 
@@ -0,0 +1,113 @@
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import pandas as pd
+from . import utils, dg_tools
+
+log = logging.getLogger(__name__)
+
+# Profiles parsed per task in reingest
+default_chunk_size = 16
+
+
+class ProfileArchive:
+    """
+    Raw player profile responses, gzipped once per distinct payload under objects/ and named by their sha256.
+    index.db maps (dg_id, fetch_date) to payloads. Safe to share between the threads of a fetcher.
+    """
+    objectExtension = '.gz'
+    indexFilename = 'index.db'
+    table_name = 'Profiles'
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, self.indexFilename), check_same_thread=False)
+        with self.conn:
+            self.conn.execute(f'''CREATE TABLE IF NOT EXISTS {self.table_name}
+                                  (dg_id INTEGER, fetch_date INTEGER, digest TEXT, PRIMARY KEY (dg_id, fetch_date, digest))''')
+
+    def path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest + self.objectExtension)
+
+    def add(self, dg_id, text, fetch_date=None):
+        """Archives a raw profile response and returns its digest"""
+        if fetch_date is None:
+            fetch_date = utils.date_to_int(date.today())
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with gzip.open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        with self.lock, self.conn:
+            self.conn.execute(f'INSERT OR IGNORE INTO {self.table_name} (dg_id, fetch_date, digest) VALUES (?, ?, ?)',
+                              (int(dg_id), int(fetch_date), digest))
+        return digest
+
+    def get(self, digest):
+        return read_object(self.path(digest))
+
+    def entries(self):
+        with self.lock:
+            return pd.read_sql_query(f'SELECT * FROM {self.table_name} ORDER BY dg_id, fetch_date', self.conn)
+
+    def latest(self, dg_ids=None, until=None):
+        """{dg_id: digest} of the last profile fetched on or before until (YYYYMMDD) for dg_ids, default everyone"""
+        s = f'SELECT dg_id, fetch_date, digest FROM {self.table_name} WHERE 1'
+        params = []
+        if dg_ids is not None:
+            s += f' AND dg_id in ({", ".join(str(int(i)) for i in dg_ids)})'
+        if until is not None:
+            s += ' AND fetch_date <= ?'
+            params.append(int(until))
+        with self.lock:
+            rows = self.conn.execute(s + ' ORDER BY fetch_date, rowid', params).fetchall()
+        return {dg_id: digest for dg_id, _, digest in rows}
+
+
+def read_object(path):
+    with gzip.open(path, 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+def load_profiles(items):
+    """Parses archived profiles, items are (dg_id, path) pairs. Runs in reingest's pool workers."""
+    return [(dg_id, dg_tools.parse_player_profile(read_object(path))) for dg_id, path in items]
+
+
+def reingest(db, archive, dg_ids=None, until=None, max_workers=None, chunk_size=default_chunk_size):
+    """
+    Rebuilds Round_History of dg_ids (default every archived player) from the latest archived profile of each,
+    without network access. Profiles are parsed on a process pool. This process replaces the rounds of one chunk
+    of players per transaction. Players whose archived profile is for another dg_id keep their stored rounds.
+    Returns the number of rounds written per dg_id rebuilt.
+    """
+    latest = archive.latest(dg_ids, until)
+    items = [(dg_id, archive.path(digest)) for dg_id, digest in latest.items()]
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    num_rounds = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for profiles in executor.map(load_profiles, chunks):
+            valid = []
+            for dg_id, profile in profiles:
+                if profile.get('dg_id') == dg_id:
+                    valid.append((dg_id, profile))
+                else:
+                    log.warning(f'Archived profile of {dg_id} is for {profile.get("dg_id")}, keeping its rounds.')
+            if len(valid) == 0:
+                continue
+            with db.write():
+                db.delete_player_rounds([dg_id for dg_id, _ in valid])
+                num_rounds.update(db.ingest_player_profiles(valid))
+    return num_rounds
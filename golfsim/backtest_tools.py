@@ -0,0 +1,153 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from . import db_tools, utils
+import sim
+
+markets = ['win', 'top5', 'top10', 'top20', 'made_cut']
+missed_cut_text = ['CUT', 'MC', 'WD', 'W/D', 'DQ', 'MDF']
+calibration_bins = [0, 0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9, 1]
+log_loss_eps = 1e-6
+
+# Per process state of the pool workers, see init_worker
+_worker = {}
+
+
+def get_snapshot(db, start_date, dg_ids, params):
+    """
+    Skill of dg_ids as of the day before start_date, using only rounds dated before start_date, read from
+    Player_Skill_Snapshots and stored there unless db is read-only. params holds max_round_age, decayFunc (a name in
+    utils) and decayArgs.
+    """
+    as_of = utils.int_to_date(str(start_date)) - timedelta(days=1)
+    return db.get_field_skill(dg_ids, params['max_round_age'], getattr(utils, params['decayFunc']),
+                              *params['decayArgs'], as_of=as_of)
+
+
+def store_snapshots(db, events, params):
+    """Stores the skill snapshot of every event's field, which the read-only pool workers then only read"""
+    fields = {}
+    for event in events.to_dict('records'):
+        fields.setdefault(event['start_date'], set()).update(get_event_results(db, event['id'])['dg_id'].tolist())
+    for start_date, dg_ids in fields.items():
+        get_snapshot(db, start_date, sorted(dg_ids), params)
+
+
+def get_events(db, since=None, until=None):
+    """Sim_Tournaments starting between since and until that have finishing positions in Round_History"""
+    s = f'''SELECT * FROM {db_tools.SimTournaments.table_name} WHERE id IN
+            (SELECT DISTINCT sim_tournament_id FROM {db_tools.RoundHistory.table_name} WHERE fin_text IS NOT NULL)'''
+    params = []
+    if since is not None:
+        s += ' AND start_date >= ?'
+        params.append(int(since))
+    if until is not None:
+        s += ' AND start_date <= ?'
+        params.append(int(until))
+    return pd.read_sql_query(s + ' ORDER BY start_date', db.conn, params=params)
+
+
+def get_event_results(db, sim_tournament_id):
+    """Field of an event with its actual outcome in every market, 1 or 0"""
+    df = pd.read_sql_query(f'''SELECT dg_id, MIN(fin_numeric) AS fin_numeric, MIN(fin_text) AS fin_text
+                               FROM {db_tools.RoundHistory.table_name} WHERE sim_tournament_id = ?
+                               GROUP BY dg_id''', db.conn, params=[int(sim_tournament_id)])
+    made_cut = ~df['fin_text'].str.upper().isin(missed_cut_text)
+    fin = df['fin_numeric'].where(made_cut)
+    df['win'] = (fin == 1).astype(int)
+    df['top5'] = (fin <= 5).astype(int)
+    df['top10'] = (fin <= 10).astype(int)
+    df['top20'] = (fin <= 20).astype(int)
+    df['made_cut'] = made_cut.astype(int)
+    return df
+
+
+def simulate_event(db, event, params):
+    """
+    Simulates one past event with skills as of its start date and returns its predictions, one row per player and
+    market with the predicted probability p and actual outcome y. Players with min_rounds or fewer rounds get
+    the field's lower quartile index and median sd.
+    """
+    results = get_event_results(db, event['id'])
+    field_index, field_sd, num_rounds = get_snapshot(db, event['start_date'], results['dg_id'].values, params)
+
+    enough_rounds = num_rounds > params['min_rounds']
+    fallback_index = np.percentile(field_index[enough_rounds], 25) if enough_rounds.any() else 0.0
+    fallback_sd = np.median(field_sd[enough_rounds]) if enough_rounds.any() else 3.0
+    field_index = np.where(enough_rounds, field_index, fallback_index)
+    field_sd = np.where(enough_rounds, field_sd, fallback_sd)
+
+    cut_round = int(event['cut_round']) if pd.notna(event['cut_round']) else 0
+    cut_line = int(event['cut_line']) if pd.notna(event['cut_line']) else 0
+    s = sim.Sim(params['num_sims'], params['num_rounds'], cut_round, cut_line, params.get('seed'))
+    s.set_num_threads(params.get('threads', 0))
+    for i, idx, std_dev in zip(results['dg_id'].values, field_index, field_sd):
+        s.add_player(int(i), float(idx), float(std_dev))
+    s.run()
+
+    df_pred = pd.DataFrame(s.results_array()).merge(results, on='dg_id', suffixes=('_p', '_y'))
+    predictions = []
+    for market in markets:
+        predictions.append(pd.DataFrame({
+            'sim_tournament_id': event['id'],
+            'start_date': event['start_date'],
+            'dg_id': df_pred['dg_id'],
+            'market': market,
+            'p': df_pred[f'{market}_p'].astype('float64'),
+            'y': df_pred[f'{market}_y']
+        }))
+    return pd.concat(predictions, ignore_index=True)
+
+
+def init_worker(db_filename):
+    _worker['db'] = db_tools.DB_Interface(db_filename, read_only=True)
+
+
+def _simulate_event(event, params):
+    return simulate_event(_worker['db'], event, params)
+
+
+def run_backtest(db_filename, events, params, max_workers=None):
+    """
+    Simulates every event (rows of get_events) on a process pool and returns all predictions, see simulate_event.
+    Skill snapshots are stored first, then each worker opens its own read-only connection to db_filename.
+    """
+    db = db_tools.DB_Interface(db_filename)
+    store_snapshots(db, events, params)
+    db.close()
+    predictions = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                             initargs=(db_filename,)) as executor:
+        futures = [executor.submit(_simulate_event, event, params) for event in events.to_dict('records')]
+        for future in as_completed(futures):
+            predictions.append(future.result())
+    if len(predictions) == 0:
+        return pd.DataFrame(columns=['sim_tournament_id', 'start_date', 'dg_id', 'market', 'p', 'y'])
+    return pd.concat(predictions, ignore_index=True).sort_values(by=['start_date', 'market', 'dg_id'],
+                                                                 ignore_index=True)
+
+
+def score_predictions(predictions):
+    """Log loss, Brier score and base rate by market"""
+    p = predictions['p'].clip(log_loss_eps, 1 - log_loss_eps)
+    y = predictions['y']
+    df = pd.DataFrame({
+        'market': predictions['market'],
+        'log_loss': -(y * np.log(p) + (1 - y) * np.log(1 - p)),
+        'brier': (predictions['p'] - y) ** 2,
+        'p': predictions['p'],
+        'y': y
+    })
+    scores = df.groupby('market').agg(n=('y', 'size'), log_loss=('log_loss', 'mean'), brier=('brier', 'mean'),
+                                      mean_p=('p', 'mean'), base_rate=('y', 'mean'))
+    return scores.reindex([m for m in markets if m in scores.index])
+
+
+def calibration_table(predictions, bins=None):
+    """Mean predicted probability against observed frequency in buckets of predicted probability, by market"""
+    if bins is None:
+        bins = calibration_bins
+    df = predictions.assign(bucket=pd.cut(predictions['p'], bins, include_lowest=True))
+    return df.groupby(['market', 'bucket'], observed=True).agg(n=('y', 'size'), mean_p=('p', 'mean'),
+                                                                observed=('y', 'mean')).reset_index()
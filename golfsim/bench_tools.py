@@ -0,0 +1,233 @@
+import json
+import os
+import platform
+import random
+import time
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from . import db_tools, utils
+import sim
+
+# Ratio to the baseline time above which a result is flagged as a regression
+default_tolerance = 0.25
+# Slowdowns smaller than this are timer noise and never flagged
+min_regression_seconds = 0.001
+
+
+class StubAPI:
+    """Serves pre-generated player profiles in place of dg_tools.API"""
+
+    def __init__(self, profiles):
+        self.profiles = profiles
+
+    def get_player_profile(self, dg_id):
+        return self.profiles[dg_id]
+
+
+def make_profiles(num_players, rounds_per_player, num_courses, end_date=None, seed=0):
+    """
+    Synthetic DataGolf player profiles. Events are a week apart counting back from end_date, each held on one of
+    num_courses courses and keyed like DataGolf events. Players play 4 rounds of a random subset of the events.
+    Returns ({dg_id: profile}, events DataFrame in the Sim_Tournaments layout).
+    """
+    if end_date is None:
+        end_date = date.today()
+    r = random.Random(seed)
+    events_per_player = max(1, rounds_per_player // 4)
+    num_events = max(events_per_player, events_per_player * 3 // 2)
+    events = []
+    for e in range(num_events):
+        start = end_date - timedelta(days=7 * (num_events - e))
+        events.append({
+            'name': f'Event {e}',
+            'start_date': utils.date_to_int(start),
+            'tour': 'pga',
+            'dg_ekey': e % 60 + 1,
+            'cut_line': 65,
+            'cut_round': 2,
+            'purse': None,
+            'course_name': f'Course {r.randrange(num_courses)}',
+            'start': start
+        })
+
+    profiles = {}
+    for dg_id in range(1, num_players + 1):
+        skill = r.gauss(0, 1)
+        played = sorted(r.sample(range(num_events), events_per_player))
+        data = []
+        fin = r.randrange(1, 80)
+        for e in played:
+            event = events[e]
+            for round_num in range(1, 5):
+                day = event['start'] + timedelta(days=round_num - 1)
+                data.append({'dg_id': dg_id, 'total': skill + r.gauss(0, 2.8), 'putt': r.gauss(0, 1),
+                             'arg': r.gauss(0, 1), 'app': r.gauss(0, 1), 'ott': r.gauss(0, 1),
+                             'round_score': 72 + r.randrange(-6, 7), 'round_num': round_num, 'fin_numeric': fin,
+                             'fin_text': f'T{fin}', 'tour': 'pga', 'course_name': event['course_name'],
+                             'date': f'{utils.months[day.month - 1]} {day.day}, {day.year}',
+                             'key': f'pga_e_{event["dg_ekey"]};{event["start"].year}'})
+        profiles[dg_id] = {'dg_id': dg_id, 'data': data}
+    df_events = pd.DataFrame(events).drop(columns=['course_name', 'start'])
+    return profiles, df_events
+
+
+def generate_db(filename, profiles, df_events, seed=0, ingest=True):
+    """
+    Creates a SQLite database in the db_tools schema with the field of make_profiles, its DataGolf predictions,
+    events and, if ingest is set, every player's round history.
+    """
+    for path in [filename, f'{filename}-wal', f'{filename}-shm']:
+        if os.path.exists(path):
+            os.remove(path)
+    db = db_tools.DB_Interface(filename)
+    db.initialize_tables()
+
+    r = random.Random(seed)
+    dg_ids = list(profiles)
+    db.players.append_df(pd.DataFrame({'dg_id': dg_ids, 'player_name': [f'Player {i}' for i in dg_ids],
+                                       'amateur': 0, 'country': 'USA', 'country_code': 'USA'}), db.conn)
+    df_pred = pd.DataFrame(columns=db_tools.CurrentDGPred.columns)
+    df_pred['dg_id'] = dg_ids
+    df_pred['player_name'] = [f'Player {i}' for i in dg_ids]
+    df_pred['final_pred'] = [r.gauss(0, 1) for _ in dg_ids]
+    df_pred['std_deviation'] = [r.uniform(2.5, 3.2) for _ in dg_ids]
+    db.currentDGPred.append_df(df_pred, db.conn)
+    db.simTournaments.append_df(df_events, db.conn)
+    if ingest:
+        db.ingest_player_profiles(list(profiles.items()))
+    db.conn.commit()
+    return db
+
+
+def time_call(func, repeat=3):
+    """Best wall time in seconds of repeat calls to func"""
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - t
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_skill(db, field, max_round_age, decayFunc, *args, repeat=3):
+    """Times round loading, calcPlayerSkill over the field and the vectorized calc_field_skill"""
+    today = date.today()
+    since = utils.get_earliest_int_date(today, max_round_age)
+    df_rounds = db.get_field_rounds(field, since=since)
+    ages = utils.get_age_int_dates(df_rounds['date'].values, utils.date_to_int(today))
+    by_player = [(df_rounds['sg_total'].values[m], ages[m])
+                 for m in (df_rounds['dg_id'].values == i for i in field)]
+
+    def per_player():
+        for tsgs, player_ages in by_player:
+            if len(tsgs) > 0:
+                utils.calcPlayerSkill(tsgs, player_ages.astype('float64'), decayFunc, *args)
+
+    return {
+        'load_rounds': time_call(lambda: db.get_field_rounds(field, since=since), repeat),
+        'calcPlayerSkill': time_call(per_player, repeat),
+        'calc_field_skill': time_call(lambda: utils.calc_field_skill(field, df_rounds['dg_id'].values,
+                                                                     df_rounds['sg_total'].values, ages,
+                                                                     decayFunc, *args), repeat)
+    }
+
+
+def bench_ingest(directory, profiles, df_events, seed=0, repeat=3):
+    """Times update_player_rounds for every profile into a database holding no rounds yet"""
+    api = StubAPI(profiles)
+    filename = os.path.join(directory, 'ingest.db')
+
+    def ingest(db):
+        for dg_id in profiles:
+            db.update_player_rounds(api, dg_id)
+
+    best = None
+    for _ in range(repeat):
+        db = generate_db(filename, profiles, df_events, seed, ingest=False)
+        t = time.perf_counter()
+        ingest(db)
+        elapsed = time.perf_counter() - t
+        db.close()
+        if best is None or elapsed < best:
+            best = elapsed
+    return {'update_player_rounds': best}
+
+
+def bench_sim(field_size, num_sims, num_rounds=4, cut_round=2, cut_line=65, seed=0, repeat=3):
+    """Times Sim.sim_rounds, Sim.sim_tournaments, Sim.stream_tournaments and both ways of exporting results"""
+    r = random.Random(seed)
+    s = sim.Sim(num_sims, num_rounds, cut_round, cut_line, seed)
+    for dg_id in range(1, field_size + 1):
+        s.add_player(dg_id, r.gauss(0, 1), r.uniform(2.5, 3.2))
+
+    def sim_tournaments():
+        s.reset_results()
+        s.sim_tournaments()
+
+    def stream_tournaments():
+        s.reset_results()
+        s.stream_tournaments()
+        s.calculate_results()
+
+    results = {'sim_rounds': time_call(s.sim_rounds, repeat)}
+    results['sim_tournaments'] = time_call(sim_tournaments, repeat)
+    results['stream_tournaments'] = time_call(stream_tournaments, repeat)
+    results['get_players'] = time_call(s.get_players, repeat)
+    results['results_array'] = time_call(s.results_array, repeat)
+    return results
+
+
+def run_suite(directory, field_sizes, sim_counts, rounds_per_player, num_courses, max_round_age, decayFunc, *args,
+              seed=0, repeat=3):
+    """
+    Times every hot path on synthetic data for each field size, and the simulation for each field size and sim count.
+    Returns a list of {'name', 'field_size', 'num_sims', 'seconds'} results, num_sims is 0 outside the simulation.
+    """
+    os.makedirs(directory, exist_ok=True)
+    results = []
+    for field_size in field_sizes:
+        profiles, df_events = make_profiles(field_size, rounds_per_player, num_courses, seed=seed)
+        db = generate_db(os.path.join(directory, 'bench.db'), profiles, df_events, seed)
+        field = np.array(list(profiles))
+        timings = bench_skill(db, field, max_round_age, decayFunc, *args, repeat=repeat)
+        db.close()
+        timings.update(bench_ingest(directory, profiles, df_events, seed, repeat))
+        results += [{'name': name, 'field_size': field_size, 'num_sims': 0, 'seconds': seconds}
+                    for name, seconds in timings.items()]
+        for num_sims in sim_counts:
+            timings = bench_sim(field_size, num_sims, seed=seed, repeat=repeat)
+            results += [{'name': name, 'field_size': field_size, 'num_sims': num_sims, 'seconds': seconds}
+                        for name, seconds in timings.items()]
+    return results
+
+
+def write_results(filename, results, params=None):
+    with open(filename, 'w') as f:
+        json.dump({
+            'date': date.today().isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'params': params or {},
+            'results': results
+        }, f, indent=2)
+
+
+def read_results(filename):
+    with open(filename, 'r') as f:
+        return json.load(f)['results']
+
+
+def compare(results, baseline, tolerance=default_tolerance):
+    """
+    Pairs results with the baseline on (name, field_size, num_sims). Returns a DataFrame with the ratio to the
+    baseline time and a regression flag for ratios above 1 + tolerance that are also min_regression_seconds slower.
+    """
+    key = ['name', 'field_size', 'num_sims']
+    df = pd.DataFrame(results).merge(pd.DataFrame(baseline), on=key, how='left', suffixes=('', '_baseline'))
+    df['ratio'] = df['seconds'] / df['seconds_baseline']
+    df['regression'] = (df['ratio'] > 1 + tolerance) & (df['seconds'] - df['seconds_baseline'] > min_regression_seconds)
+    return df
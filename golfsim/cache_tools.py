@@ -0,0 +1,103 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+from urllib.parse import urlencode
+from . import utils, trace_tools
+
+# Request params that never form part of a cache key
+ignored_params = ['key']
+
+
+class MemoryBackend:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, fetched, text):
+        self.data[key] = (fetched, text)
+
+
+class DiskBackend:
+    """
+    One gzipped JSON file per response, named by the hash of the cache key.
+    """
+    fileExtension = '.json.gz'
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + self.fileExtension)
+
+    def get(self, key):
+        try:
+            with gzip.open(self._path(key), 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+            return None
+        return entry['fetched'], entry['text']
+
+    def set(self, key, fetched, text):
+        path = self._path(key)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            json.dump({'key': key, 'fetched': fetched, 'text': text}, f)
+        os.replace(tmp, path)
+
+
+class ResponseCache:
+    """
+    Response cache keyed by url and params. Entries older than the ttl passed to get are ignored,
+    unless replay is set, in which case every request must be served from the cache.
+    """
+    def __init__(self, backend=None, replay=False):
+        if backend is None:
+            backend = MemoryBackend()
+        self.backend = backend
+        self.replay = replay
+
+    @staticmethod
+    def make_key(url, params=None):
+        items = sorted((k, str(v)) for k, v in (params or {}).items() if k not in ignored_params)
+        return f'{url}?{urlencode(items)}'
+
+    def get(self, url, params=None, ttl=0):
+        key = self.make_key(url, params)
+        entry = self.backend.get(key)
+        if entry is None:
+            if self.replay:
+                raise utils.CacheMissError(f'No cached response for {key}')
+            return None
+        fetched, text = entry
+        if self.replay or time.time() - fetched < ttl:
+            return text
+        return None
+
+    def set(self, url, params, text):
+        self.backend.set(self.make_key(url, params), time.time(), text)
+
+
+def get_text(session, url, params=None, cache=None, ttl=0, before_request=None):
+    """Text of url, from cache if fresh. before_request, e.g. a rate limiter, is called only when a request is sent."""
+    if cache is not None:
+        text = cache.get(url, params, ttl)
+        if text is not None:
+            trace_tools.count('http.cache_hits')
+            return text
+    if before_request is not None:
+        before_request()
+    t = time.perf_counter()
+    res = session.get(url=url, params=params)
+    trace_tools.count('http.requests')
+    trace_tools.count('http.bytes', len(res.content))
+    trace_tools.count('http.seconds', time.perf_counter() - t)
+    if res.status_code != 200:
+        raise utils.ResponseErrorHTTP(f'Invalid HTTP Status Code from {url}: {res.status_code}')
+    if cache is not None:
+        cache.set(url, params, res.text)
+    return res.text
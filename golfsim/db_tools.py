@@ -1,6 +1,23 @@
+import ast
+import json
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+import numpy as np
 import pandas as pd
-from . import utils
+from . import utils, trace_tools
+
+# Applied to every connection. WAL lets readers run alongside one writer, NORMAL sync is safe in WAL mode.
+pragmas = {
+    'synchronous': 'NORMAL',
+    'cache_size': -65536,  # KiB
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY'
+}
+journal_mode = 'WAL'
+busy_timeout = 60  # seconds a connection waits for another process's write lock
 
 def list_to_query_string(items):
     s = ''
@@ -9,11 +26,24 @@ def list_to_query_string(items):
     return s[:-2]
 
 
+def table_exists(conn, table_name):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+    return cursor.fetchone()[0] > 0
+
+
+def create_index(conn, table_name, name, columns, unique=False):
+    conn.execute(f'''CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} 
+                     ON {table_name} ({list_to_query_string(columns)})''')
+
+
 class Table:
     table_name = ''
     columns = []
     dtypes = []
     foreign_keys = []
+    indexes = {}
+    unique_indexes = {}
     auto_incr_index = True
     index_name = 'index'
 
@@ -48,23 +78,34 @@ class Table:
         return df
 
     def get_all(self, conn):
-        return pd.read_sql_query(f'SELECT * FROM {self.table_name}', conn)
+        df = pd.read_sql_query(f'SELECT * FROM {self.table_name}', conn)
+        trace_tools.count('sql.rows_read', len(df))
+        return df
 
     def get_columns(self, columns, conn):
         s = self._build_select_column_string(columns)
-        return pd.read_sql_query(s, conn)
+        df = pd.read_sql_query(s, conn)
+        trace_tools.count('sql.rows_read', len(df))
+        return df
+
+    def _insert_df(self, df, conn):
+        # executemany rather than DataFrame.to_sql, which commits and so would end a transaction begun by write()
+        columns = ([self.index_name] if self.auto_incr_index else []) + list(df.columns)
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=self.auto_incr_index, name=None)
+        conn.executemany(f'''INSERT INTO {self.table_name} ({list_to_query_string(columns)}) 
+                              VALUES ({list_to_query_string(['?'] * len(columns))})''', list(rows))
+        trace_tools.count('sql.rows_written', len(df))
 
     def append_df(self, df, conn):
         if self.auto_incr_index:
             self._update_index(df, conn)
-        df.to_sql(self.table_name, conn, if_exists='append', index=self.auto_incr_index, index_label=self.index_name)
+        self._insert_df(df, conn)
 
     def replace_df(self, df, conn):
+        conn.execute(f'DELETE FROM {self.table_name}')
         if self.auto_incr_index:
             self._update_index(df, conn)
-        self.drop_table(conn)
-        self.create_table(conn)
-        df.to_sql(self.table_name, conn, if_exists='append', index=self.auto_incr_index, index_label=self.index_name)
+        self._insert_df(df, conn)
 
     def drop_table(self, conn):
         cursor = conn.cursor()
@@ -89,13 +130,28 @@ class Table:
                 s += f'FOREIGN KEY({key}) REFERENCES {self.foreign_keys[key]}, '
         s = s[:-2] + ')'
         cursor.execute(s)
+        self.create_indexes(conn)
+
+    def exists(self, conn):
+        return table_exists(conn, self.table_name)
+
+    def create_indexes(self, conn, unique=True):
+        for name, columns in self.indexes.items():
+            create_index(conn, self.table_name, name, columns)
+        if unique:
+            for name, columns in self.unique_indexes.items():
+                create_index(conn, self.table_name, name, columns, unique=True)
 
 
 class SimTournaments(Table):
     table_name = 'Sim_Tournaments'
+    # purse is left NULL, purses are kept in Purses
     columns = ['id', 'name', 'start_date', 'tour', 'dg_ekey', 'cut_line', 'cut_round', 'purse']
     dtypes = ['INTEGER', 'TEXT', 'INTEGER', 'TEXT', 'INTEGER', 'INTEGER', 'INTEGER', 'TEXT']
     index_name = 'id'
+    indexes = {
+        'idx_sim_tournaments_dg_ekey_start_date': ['dg_ekey', 'start_date']
+    }
 
 
 class RoundHistory(Table):
@@ -112,6 +168,10 @@ class RoundHistory(Table):
         'course_id': 'Courses(id)',
         'sim_tournament_id': 'Sim_Tournaments(id)'
     }
+    indexes = {
+        'idx_round_history_dg_id_date': ['dg_id', 'date'],
+        'idx_round_history_date': ['date']
+    }
 
 
 class Courses(Table):
@@ -119,6 +179,9 @@ class Courses(Table):
     columns = ['id', 'name']
     dtypes = ['INTEGER', 'TEXT']
     index_name = 'id'
+    unique_indexes = {
+        'idx_courses_name_unique': ['name']
+    }
 
 
 class Players(Table):
@@ -156,26 +219,287 @@ class TournamentPlayerPredictions(Table):
         'dg_id': 'Players(dg_id)',
         'sim_tournament_id': 'SimTournaments(id)'
     }
+    indexes = {
+        'idx_tournament_player_predictions_sim_tournament_id_sim_date': ['sim_tournament_id', 'sim_date'],
+        'idx_tournament_player_predictions_dg_id_sim_tournament_id': ['dg_id', 'sim_tournament_id']
+    }
+    index_name = 'id'
+    # Sim.results_array column of each prediction column
+    sim_columns = {
+        'dg_id': 'dg_id',
+        'x_earnings': 'avg_earnings',
+        'sim_win': 'win',
+        'sim_top5': 'top5',
+        'sim_top10': 'top10',
+        'sim_top20': 'top20',
+        'sim_made_cut': 'made_cut',
+        'x_finish': 'avg_finish',
+        'sg_index': 'index',
+        'sg_sd': 'std_dev'
+    }
+
+
+class PlayerSyncState(Table):
+    table_name = 'Player_Sync_State'
+    columns = ['dg_id', 'last_fetch_date', 'last_round_date', 'profile_hash']
+    dtypes = ['INTEGER', 'INTEGER', 'INTEGER', 'TEXT']
+    foreign_keys = {
+        'dg_id': 'Players(dg_id)'
+    }
+    auto_incr_index = False
+    index_name = 'dg_id'
+
+
+class PlayerSkillSnapshots(Table):
+    # Skill of a player as of a date for one set of skill parameters, dropped when the player gets new rounds.
+    # decay_func is the function name, decay_args its arguments as JSON.
+    table_name = 'Player_Skill_Snapshots'
+    columns = ['id', 'dg_id', 'as_of_date', 'decay_func', 'decay_args', 'max_round_age', 'sg_index', 'sg_sd',
+               'num_rounds']
+    dtypes = ['INTEGER', 'INTEGER', 'INTEGER', 'TEXT', 'TEXT', 'INTEGER', 'FLOAT', 'FLOAT', 'INTEGER']
+    foreign_keys = {
+        'dg_id': 'Players(dg_id)'
+    }
+    indexes = {
+        'idx_player_skill_snapshots_dg_id': ['dg_id']
+    }
+    unique_indexes = {
+        'idx_player_skill_snapshots_key': ['as_of_date', 'decay_func', 'decay_args', 'max_round_age', 'dg_id']
+    }
     index_name = 'id'
 
 
+class Purses(Table):
+    table_name = 'Purses'
+    # url is the page the purse was read from
+    columns = ['id', 'sim_tournament_id', 'position', 'payout', 'url']
+    dtypes = ['INTEGER', 'INTEGER', 'INTEGER', 'INTEGER', 'TEXT']
+    foreign_keys = {
+        'sim_tournament_id': 'Sim_Tournaments(id)'
+    }
+    unique_indexes = {
+        'idx_purses_sim_tournament_id_position': ['sim_tournament_id', 'position']
+    }
+    index_name = 'id'
+
+
+# Migrations name the tables and indexes of their own schema version rather than reading db.tables or a Table's
+# indexes, which describe the latest schema and may hold tables that a later migration creates.
+def migration_create_indexes(db):
+    indexes = [
+        (SimTournaments.table_name, 'idx_sim_tournaments_dg_ekey_start_date', ['dg_ekey', 'start_date']),
+        (RoundHistory.table_name, 'idx_round_history_dg_id_date', ['dg_id', 'date']),
+        (RoundHistory.table_name, 'idx_round_history_date', ['date']),
+        (Courses.table_name, 'idx_courses_name', ['name']),
+        (TournamentPlayerPredictions.table_name, 'idx_tournament_player_predictions_sim_tournament_id_sim_date',
+         ['sim_tournament_id', 'sim_date'])
+    ]
+    for table_name, name, columns in indexes:
+        if table_exists(db.conn, table_name):
+            create_index(db.conn, table_name, name, columns)
+
+
+def migration_create_missing_tables(db):
+    for table in [db.players, db.simTournaments, db.tournamentPlayerPredictions, db.courses, db.roundHistory,
+                  db.currentDGPred, db.playerSyncState]:
+        if not table.exists(db.conn):
+            table.create_table(db.conn)
+
+
+def migration_unique_course_names(db):
+    # Older versions could insert the same course name several times. Keep the lowest id for each name.
+    cursor = db.conn.cursor()
+    cursor.execute(f'''UPDATE {RoundHistory.table_name} SET course_id = (
+                           SELECT MIN(c2.id) FROM {Courses.table_name} c1 
+                           JOIN {Courses.table_name} c2 ON c1.name = c2.name 
+                           WHERE c1.id = {RoundHistory.table_name}.course_id)
+                       WHERE course_id IN (SELECT id FROM {Courses.table_name})''')
+    cursor.execute(f'''DELETE FROM {Courses.table_name} 
+                       WHERE id NOT IN (SELECT MIN(id) FROM {Courses.table_name} GROUP BY name)''')
+    cursor.execute('DROP INDEX IF EXISTS idx_courses_name')
+    create_index(db.conn, Courses.table_name, 'idx_courses_name_unique', ['name'], unique=True)
+
+
+def migration_add_skill_snapshots(db):
+    if not db.playerSkillSnapshots.exists(db.conn):
+        db.playerSkillSnapshots.create_table(db.conn)
+
+
+def migration_add_prediction_indexes(db):
+    create_index(db.conn, TournamentPlayerPredictions.table_name,
+                 'idx_tournament_player_predictions_dg_id_sim_tournament_id', ['dg_id', 'sim_tournament_id'])
+
+
+def migration_add_purses(db):
+    # Older versions kept str() of the purse dict in Sim_Tournaments.purse
+    if not db.purses.exists(db.conn):
+        db.purses.create_table(db.conn)
+    cursor = db.conn.cursor()
+    cursor.execute(f"SELECT id, purse FROM {SimTournaments.table_name} WHERE purse IS NOT NULL AND purse NOT IN ('', '{{}}')")
+    for sim_tournament_id, text in cursor.fetchall():
+        try:
+            purse = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            continue
+        if isinstance(purse, dict):
+            cursor.executemany(f'INSERT INTO {Purses.table_name} (sim_tournament_id, position, payout) VALUES (?, ?, ?)',
+                               [(sim_tournament_id, int(pos), int(pay)) for pos, pay in purse.items()])
+
+
+def migration_add_purse_urls(db):
+    # Purses created by migration_add_purses on this version already have the column
+    columns = [row[1] for row in db.conn.execute(f'PRAGMA table_info({Purses.table_name})').fetchall()]
+    if 'url' not in columns:
+        db.conn.execute(f'ALTER TABLE {Purses.table_name} ADD COLUMN url TEXT')
+
+
+# Append only. The position in the list (starting at 1) is the schema version stored in PRAGMA user_version.
+migrations = [
+    migration_create_indexes,
+    migration_create_missing_tables,
+    migration_unique_course_names,
+    migration_add_skill_snapshots,
+    migration_add_prediction_indexes,
+    migration_add_purses,
+    migration_add_purse_urls
+]
+
+
+class ConnectionManager:
+    """
+    Connections to one database file, one per thread and process, opened on first use. Read-only managers open the
+    file with mode=ro. Writes go through write(), which holds the write lock of this process and an immediate
+    transaction, so writers in other processes wait for busy_timeout instead of failing with "database is locked".
+    """
+
+    def __init__(self, filename, read_only=False, timeout=busy_timeout):
+        self.filename = filename
+        self.read_only = read_only
+        self.timeout = timeout
+        self.write_lock = threading.RLock()
+        self._local = threading.local()
+        self._connections = []
+        self._pid = os.getpid()
+
+    def connect(self):
+        if self.read_only:
+            conn = sqlite3.connect(f'file:{self.filename}?mode=ro', uri=True, timeout=self.timeout,
+                                   check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.filename, timeout=self.timeout, check_same_thread=False)
+            conn.execute(f'PRAGMA journal_mode = {journal_mode}')
+        for name, value in pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    @property
+    def conn(self):
+        if os.getpid() != self._pid:
+            # Connections must not cross a fork, start over in the child
+            self._local = threading.local()
+            self._connections = []
+            self._pid = os.getpid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+            self._connections.append(conn)
+            trace_tools.watch_connection(self, conn)
+        return conn
+
+    @contextmanager
+    def write(self):
+        """Transaction on this thread's connection, committed on exit. Nested calls join the outer transaction."""
+        if self.read_only:
+            raise sqlite3.OperationalError(f'{self.filename} is open read-only')
+        with self.write_lock:
+            conn = self.conn
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def close(self):
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+        self._local = threading.local()
+
+
 class DB_Interface:
-    def __init__(self, filename):
-        self.conn = sqlite3.connect(filename)
+    def __init__(self, filename, read_only=False):
+        self.connections = ConnectionManager(filename, read_only)
         self.simTournaments = SimTournaments()
         self.roundHistory = RoundHistory()
         self.courses = Courses()
         self.players = Players()
         self.currentDGPred = CurrentDGPred()
         self.tournamentPlayerPredictions = TournamentPlayerPredictions()
+        self.playerSyncState = PlayerSyncState()
+        self.playerSkillSnapshots = PlayerSkillSnapshots()
+        self.purses = Purses()
+        self.tables = [self.players, self.simTournaments, self.tournamentPlayerPredictions, self.courses,
+                       self.roundHistory, self.currentDGPred, self.playerSyncState, self.playerSkillSnapshots,
+                       self.purses]
+        if self.has_tables() and not read_only:
+            self.migrate()
+
+    @property
+    def conn(self):
+        """This thread's connection"""
+        return self.connections.conn
+
+    @property
+    def read_only(self):
+        return self.connections.read_only
+
+    def write(self):
+        return self.connections.write()
+
+    def close(self):
+        self.connections.close()
 
     def initialize_tables(self):
-        self.players.create_table(self.conn)
-        self.simTournaments.create_table(self.conn)
-        self.tournamentPlayerPredictions.create_table(self.conn)
-        self.courses.create_table(self.conn)
-        self.roundHistory.create_table(self.conn)
-        self.currentDGPred.create_table(self.conn)
+        for table in self.tables:
+            table.create_table(self.conn)
+        # create_table already builds the latest schema
+        self.set_schema_version(len(migrations))
+
+    def has_tables(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+        return cursor.fetchone()[0] > 0
+
+    def get_schema_version(self):
+        return self.conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def set_schema_version(self, version):
+        self.conn.execute(f'PRAGMA user_version = {int(version)}')
+        self.conn.commit()
+
+    def migrate(self):
+        version = self.get_schema_version()
+        for v in range(version, len(migrations)):
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Another process may have migrated while we waited for the write lock
+                if self.get_schema_version() > v:
+                    self.conn.commit()
+                    continue
+                migrations[v](self)
+                self.conn.execute(f'PRAGMA user_version = {v + 1}')
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def explain_query_plan(self, query, params=()):
+        return [row[-1] for row in self.conn.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()]
 
     # TODO:cleanup
     def get_player_rounds(self, dg_ids, columns=None):
@@ -186,6 +510,85 @@ class DB_Interface:
 
         return pd.read_sql_query(s, self.conn)
 
+    @trace_tools.traced()
+    def get_field_rounds(self, dg_ids, since=None, columns=None, until=None):
+        """Rounds of dg_ids, or of every player when None, dated after since and before until"""
+        if columns is None:
+            columns = ['dg_id', 'date', 'sg_total']
+        s = f'''SELECT {list_to_query_string(columns)} FROM {RoundHistory.table_name} WHERE 1'''
+        params = []
+        if dg_ids is not None:
+            s += f' AND dg_id in ({list_to_query_string([int(i) for i in dg_ids])})'
+        if since is not None:
+            s += ' AND date > ?'
+            params.append(int(since))
+        if until is not None:
+            s += ' AND date < ?'
+            params.append(int(until))
+        df = pd.read_sql_query(s, self.conn, params=params)
+        trace_tools.count('sql.rows_read', len(df))
+        return df
+
+    @trace_tools.traced()
+    def get_field_skill(self, dg_ids, max_round_age, decayFunc, *args, as_of=None):
+        """
+        Decayed sg_total mean, sd and number of rounds for each of dg_ids from rounds up to as_of (default today),
+        see utils.calc_field_skill. Results are read from Player_Skill_Snapshots, players without a snapshot for
+        these parameters are calculated and stored.
+        """
+        if as_of is None:
+            as_of = date.today()
+        key = (utils.date_to_int(as_of), max_round_age, decayFunc.__name__, json.dumps(list(args)))
+        stored = self.get_skill_snapshots(*key).reindex(dg_ids)
+        index = stored['sg_index'].values.astype('float64')
+        sd = stored['sg_sd'].values.astype('float64')
+        num_rounds = stored['num_rounds'].values
+        missing = np.isnan(num_rounds.astype('float64'))
+        num_rounds = np.where(missing, 0, num_rounds).astype('int64')
+        trace_tools.count('skill.snapshot_hits', int((~missing).sum()))
+        if missing.any():
+            ids = np.asarray(dg_ids)[missing]
+            df_rounds = self.get_field_rounds(ids, since=utils.get_earliest_int_date(as_of, max_round_age),
+                                              until=utils.date_to_int(as_of + timedelta(days=1)))
+            ages = utils.get_age_int_dates(df_rounds['date'].values, key[0])
+            index[missing], sd[missing], num_rounds[missing] = utils.calc_field_skill(
+                ids, df_rounds['dg_id'].values, df_rounds['sg_total'].values, ages, decayFunc, *args)
+            self.set_skill_snapshots(*key, ids, index[missing], sd[missing], num_rounds[missing])
+        return index, sd, num_rounds
+
+    def get_skill_snapshots(self, as_of_date, max_round_age, decay_func, decay_args):
+        """Stored skills for one as_of_date and set of skill parameters, indexed by dg_id"""
+        df = pd.read_sql_query(f'''SELECT dg_id, sg_index, sg_sd, num_rounds FROM {PlayerSkillSnapshots.table_name}
+                                   WHERE as_of_date = ? AND decay_func = ? AND decay_args = ? AND max_round_age = ?''',
+                               self.conn, params=[int(as_of_date), decay_func, decay_args, int(max_round_age)])
+        trace_tools.count('sql.rows_read', len(df))
+        return df.set_index('dg_id')
+
+    def set_skill_snapshots(self, as_of_date, max_round_age, decay_func, decay_args, dg_ids, index, sd, num_rounds):
+        if self.read_only:
+            # Snapshots are only a cache, readers recalculate them
+            return
+        rows = [(int(dg_id), int(as_of_date), decay_func, decay_args, int(max_round_age),
+                 None if np.isnan(i) else float(i), None if np.isnan(s) else float(s), int(n))
+                for dg_id, i, s, n in zip(dg_ids, index, sd, num_rounds)]
+        with self.write() as conn:
+            conn.executemany(f'''INSERT OR REPLACE INTO {PlayerSkillSnapshots.table_name} 
+                                      ({list_to_query_string(PlayerSkillSnapshots.columns[1:])})
+                                      VALUES ({list_to_query_string(['?'] * (len(PlayerSkillSnapshots.columns) - 1))})''',
+                                  rows)
+        trace_tools.count('sql.rows_written', len(rows))
+
+    def delete_player_rounds(self, dg_ids):
+        with self.write():
+            self.conn.execute(f'''DELETE FROM {RoundHistory.table_name} 
+                                  WHERE dg_id in ({list_to_query_string([int(i) for i in dg_ids])})''')
+            self.invalidate_skill_snapshots(dg_ids)
+
+    def invalidate_skill_snapshots(self, dg_ids):
+        """Drops every stored skill of dg_ids, call whenever their rounds change"""
+        self.conn.execute(f'''DELETE FROM {PlayerSkillSnapshots.table_name} 
+                              WHERE dg_id in ({list_to_query_string([int(i) for i in dg_ids])})''')
+
     def get_player_names(self):
         return self.players.get_all(self.conn)
 
@@ -218,34 +621,144 @@ class DB_Interface:
         if len(res) > 0:
             return int(res.values[0])
 
+    @trace_tools.traced()
     def get_tournament_player_pred(self, id, date=None):
-        if date is None:
-            return pd.read_sql_query(f'''SELECT * FROM {self.tournamentPlayerPredictions.table_name}
-                                        WHERE sim_tournament_id = {id};''', self.conn)
-        else:
-            return pd.read_sql_query(f'''SELECT * FROM {self.tournamentPlayerPredictions.table_name}
-                                        WHERE sim_tournament_id = {id} AND sim_date = {date};''', self.conn)
+        s = f'SELECT * FROM {TournamentPlayerPredictions.table_name} WHERE sim_tournament_id = ?'
+        params = [int(id)]
+        if date is not None:
+            s += ' AND sim_date = ?'
+            params.append(int(date))
+        df = pd.read_sql_query(s, self.conn, params=params)
+        trace_tools.count('sql.rows_read', len(df))
+        return df
+
+    def get_player_pred_history(self, dg_id, since=None):
+        """Every prediction for one player with the tournament's name and start date, oldest tournament first"""
+        s = f'''SELECT p.*, t.name, t.start_date FROM {TournamentPlayerPredictions.table_name} p
+                JOIN {SimTournaments.table_name} t ON t.id = p.sim_tournament_id WHERE p.dg_id = ?'''
+        params = [int(dg_id)]
+        if since is not None:
+            s += ' AND t.start_date >= ?'
+            params.append(int(since))
+        df = pd.read_sql_query(s + ' ORDER BY t.start_date, p.sim_date', self.conn, params=params)
+        trace_tools.count('sql.rows_read', len(df))
+        return df
+
+    def get_latest_player_pred(self, sim_tournament_ids=None):
+        """Predictions of the latest sim_date of each tournament, or of each of sim_tournament_ids"""
+        s = f'''SELECT p.* FROM {TournamentPlayerPredictions.table_name} p JOIN 
+                    (SELECT sim_tournament_id, MAX(sim_date) AS sim_date FROM {TournamentPlayerPredictions.table_name}
+                     GROUP BY sim_tournament_id) latest
+                ON p.sim_tournament_id = latest.sim_tournament_id AND p.sim_date = latest.sim_date'''
+        if sim_tournament_ids is not None:
+            s += f' WHERE p.sim_tournament_id in ({list_to_query_string([int(i) for i in sim_tournament_ids])})'
+        df = pd.read_sql_query(s + ' ORDER BY p.sim_tournament_id, p.dg_id', self.conn)
+        trace_tools.count('sql.rows_read', len(df))
+        return df
+
+    def get_purse(self, sim_tournament_id, url=None):
+        """
+        {position: payout} of a tournament, None if no purse is stored. Given url, only a purse read from that page,
+        or from an unknown page, is returned.
+        """
+        if sim_tournament_id is None:
+            return None
+        s = f'SELECT position, payout FROM {Purses.table_name} WHERE sim_tournament_id = ?'
+        params = [int(sim_tournament_id)]
+        if url is not None:
+            s += ' AND (url = ? OR url IS NULL)'
+            params.append(url)
+        purse = dict(self.conn.execute(s, params).fetchall())
+        return purse if len(purse) > 0 else None
+
+    def set_purse(self, sim_tournament_id, purse, url=None):
+        """Replaces the stored purse of a tournament"""
+        if self.read_only:
+            return
+        with self.write():
+            self.insert_purse(sim_tournament_id, purse, url)
+
+    def insert_purse(self, sim_tournament_id, purse, url=None):
+        self.conn.execute(f'DELETE FROM {Purses.table_name} WHERE sim_tournament_id = ?', (int(sim_tournament_id),))
+        self.conn.executemany(f'''INSERT INTO {Purses.table_name} (sim_tournament_id, position, payout, url) 
+                                  VALUES (?, ?, ?, ?)''',
+                              [(int(sim_tournament_id), int(pos), int(pay), url) for pos, pay in purse.items()])
 
     def add_sim_tournament(self, df):
-        self.simTournaments.append_df(df, self.conn)
+        with self.write():
+            self.simTournaments.append_df(df, self.conn)
 
     def add_player_rounds(self, df):
-        self.roundHistory.append_df(df, self.conn)
+        with self.write():
+            self.roundHistory.append_df(df, self.conn)
+            self.invalidate_skill_snapshots(df['dg_id'].unique())
 
     def add_courses(self, df):
-        self.courses.append_df(df, self.conn)
+        with self.write():
+            self.courses.append_df(df, self.conn)
 
     def update_courses(self, df):
-        df = df[~df['name'].isin(self.get_courses()['name'])]
-        self.add_courses(df)
-
+        with self.write():
+            self.insert_courses(df['name'])
+
+    def insert_courses(self, names):
+        # Missing and empty names are skipped, NULLs would not be unique. Their rounds get a NULL course_id.
+        cursor = self.conn.cursor()
+        cursor.executemany(f'INSERT OR IGNORE INTO {Courses.table_name} (name) VALUES (?)',
+                           [(name,) for name in set(names) if name])
+
+    def get_course_ids(self):
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT name, id FROM {Courses.table_name} WHERE name IS NOT NULL AND name != ''")
+        return dict(cursor.fetchall())
+
+    def get_sim_tournament_ids(self):
+        """
+        Map (dg_ekey, year) to the first Sim_Tournaments id of that event in that year.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(f'SELECT dg_ekey, start_date, id FROM {SimTournaments.table_name} ORDER BY id DESC')
+        return {(ekey, start_date // 10000): id for ekey, start_date, id in cursor.fetchall()}
+
+    @trace_tools.traced()
     def update_player_predictions(self, df):
-        self.tournamentPlayerPredictions.append_df(df, self.conn)
-
+        columns = TournamentPlayerPredictions.columns[1:]
+        self.insert_predictions(columns, list(df[columns].itertuples(index=False, name=None)))
+
+    @trace_tools.traced()
+    def add_predictions(self, sim_tournament_id, sim_date, results):
+        """
+        Saves a run's predictions straight from the columns of Sim.results_array, replacing any saved for the same
+        tournament and sim_date.
+        """
+        columns = list(TournamentPlayerPredictions.sim_columns)
+        values = [np.asarray(results[c]).tolist() for c in TournamentPlayerPredictions.sim_columns.values()]
+        num_players = len(values[0])
+        rows = list(zip(*values, [int(sim_tournament_id)] * num_players, [int(sim_date)] * num_players))
+        self.insert_predictions(columns + ['sim_tournament_id', 'sim_date'], rows,
+                                replace=(int(sim_tournament_id), int(sim_date)))
+
+    def insert_predictions(self, columns, rows, replace=None):
+        """
+        Inserts rows of the given Tournament_Player_Predictions columns in one transaction. replace is an optional
+        (sim_tournament_id, sim_date) whose predictions are deleted first.
+        """
+        with self.write() as conn:
+            if replace is not None:
+                conn.execute(f'''DELETE FROM {TournamentPlayerPredictions.table_name} 
+                                      WHERE sim_tournament_id = ? AND sim_date = ?''', replace)
+            conn.executemany(f'''INSERT INTO {TournamentPlayerPredictions.table_name} 
+                                      ({list_to_query_string(columns)}) 
+                                      VALUES ({list_to_query_string(['?'] * len(columns))})''', rows)
+        trace_tools.count('sql.rows_written', len(rows))
+
+    @trace_tools.traced()
     def update_sim_tournaments(self, df):
-        df = df[~df['start_date'].isin(self.get_sim_tournaments()['start_date'])]
-        self.simTournaments.append_df(df, self.conn)
+        with self.write():
+            df = df[~df['start_date'].isin(self.get_sim_tournaments()['start_date'])]
+            self.simTournaments.append_df(df, self.conn)
 
+    @trace_tools.traced()
     def update_dg_pred(self, api, tour=None):
         df = pd.DataFrame(api.get_player_skill_decomp(tour)['players'])
         
@@ -253,31 +766,164 @@ class DB_Interface:
         col = [i for i in df.columns if i not in CurrentDGPred.columns]
         df = df.drop(columns=col)
 
-        self.currentDGPred.replace_df(df, self.conn)
+        with self.write():
+            self.currentDGPred.replace_df(df, self.conn)
 
+    @trace_tools.traced()
     def update_player_names(self, api):
         df = pd.DataFrame(api.get_player_names())
-        df = df[~df['dg_id'].isin(self.get_player_names()['dg_id'])]
-        self.players.append_df(df, self.conn)
+        with self.write():
+            df = df[~df['dg_id'].isin(self.get_player_names()['dg_id'])]
+            self.players.append_df(df, self.conn)
 
     def update_player_rounds(self, api, dg_id):
-        player_profile = api.get_player_profile(dg_id)
-        if player_profile['dg_id'] != dg_id:
-            return 0
-        df = pd.DataFrame(player_profile['data'])
-        col = [i for i in df.columns if i not in RoundHistory.dg_columns]
-        df = df.drop(columns=col)
-        df['date'] = [utils.text_date_to_int(d) for d in df['date']]
-        df = df[~df['date'].isin(self.get_player_rounds([dg_id], ['date']).astype('int64')['date'])]
-        if df.empty:
-            return 0
-        # TODO: get rid of colums[1:] - id column
-        df = df.rename(columns=dict(zip(RoundHistory.dg_columns, RoundHistory.columns[1:])))
-        df_courses = self.courses.get_df()
-        df_courses['name'] = df['course_id']
-        self.update_courses(df_courses)
-        df['course_id'] = [self.get_course_id(i) for i in df['course_id']]
-        df['sim_tournament_id'] = [utils.getSubstringFromIdentifiers(i, 'pga_e_', ';') for i in df['sim_tournament_id']]
-        df['sim_tournament_id'] = [self.get_sim_tournament_id(df.loc[i]) for i in df.index.values]
-        self.roundHistory.append_df(df, self.conn)
-        return len(df)
+        return self.add_player_profile(dg_id, api.get_player_profile(dg_id))
+
+    def get_sync_state(self):
+        return self.playerSyncState.get_all(self.conn)
+
+    def get_profile_hashes(self, dg_ids):
+        cursor = self.conn.cursor()
+        cursor.execute(f'''SELECT dg_id, profile_hash FROM {PlayerSyncState.table_name} 
+                           WHERE dg_id in ({list_to_query_string([int(i) for i in dg_ids])})''')
+        return dict(cursor.fetchall())
+
+    @trace_tools.traced()
+    def set_sync_states(self, states):
+        """
+        states: list of (dg_id, fetch_date, profile_hash)
+        """
+        trace_tools.count('sql.rows_written', len(states))
+        with self.write() as conn:
+            conn.executemany(f'''INSERT OR REPLACE INTO {PlayerSyncState.table_name} 
+                                      (dg_id, last_fetch_date, last_round_date, profile_hash)
+                                      VALUES (?, ?, (SELECT MAX(date) FROM {RoundHistory.table_name} WHERE dg_id = ?), ?)''',
+                                  [(int(dg_id), int(fetch_date), int(dg_id), profile_hash)
+                                   for dg_id, fetch_date, profile_hash in states])
+
+    def get_player_tours(self, dg_ids, since):
+        """{dg_id: set of tours} each of dg_ids has rounds on, from rounds dated after since"""
+        cursor = self.conn.cursor()
+        cursor.execute(f'''SELECT DISTINCT dg_id, tour FROM {RoundHistory.table_name} 
+                           WHERE dg_id in ({list_to_query_string([int(i) for i in dg_ids])}) AND date > ?''',
+                       (int(since),))
+        tours = {}
+        for dg_id, tour in cursor.fetchall():
+            if tour:
+                tours.setdefault(dg_id, set()).add(tour.lower())
+        return tours
+
+    @trace_tools.traced()
+    def plan_player_updates(self, dg_ids, schedule, today=None, max_sync_age=14, event_days=4, full=False,
+                            tour_history=365):
+        """
+        Return the dg_ids whose profiles may hold rounds we have not stored.
+        A player is stale if they were never synced, their last sync is older than max_sync_age days, or an event
+        of schedule (a list of get-schedule events) on one of their tours had a round on or after the day of their
+        last sync. An event's rounds are on its first event_days days. A player's tours are those of their rounds
+        in the last tour_history days. Events of a tour no stored round has, or without a tour, count for everyone.
+        """
+        if full:
+            return list(dg_ids)
+        if today is None:
+            today = date.today()
+        events = []
+        for e in schedule:
+            start = date.fromisoformat(e['start_date'])
+            if start <= today:
+                tour = e.get('tour')
+                events.append((utils.date_to_int(start + timedelta(days=event_days - 1)), tour and tour.lower()))
+        oldest_fetch = utils.get_earliest_int_date(today, max_sync_age)
+        last_fetch = dict(self.get_sync_state()[['dg_id', 'last_fetch_date']].values)
+        player_tours = self.get_player_tours(dg_ids, utils.get_earliest_int_date(today, tour_history))
+        known_tours = set().union(*player_tours.values())
+
+        stale = []
+        for dg_id in dg_ids:
+            fetched = last_fetch.get(dg_id)
+            if fetched is None or fetched < oldest_fetch:
+                stale.append(dg_id)
+                continue
+            tours = player_tours.get(dg_id)
+            for last_round_day, tour in events:
+                if last_round_day >= fetched and (not tours or tour not in known_tours or tour in tours):
+                    stale.append(dg_id)
+                    break
+        return stale
+
+    def add_player_profile(self, dg_id, player_profile, fetch_date=None):
+        return self.add_player_profiles([(dg_id, player_profile)], fetch_date)[dg_id]
+
+    @trace_tools.traced()
+    def add_player_profiles(self, profiles, fetch_date=None):
+        """
+        Ingest a batch of (dg_id, profile) pairs, skipping profiles identical to the last one synced.
+        Returns the number of new rounds per dg_id.
+        """
+        if fetch_date is None:
+            fetch_date = utils.date_to_int(date.today())
+        hashes = {dg_id: utils.hash_json(profile) for dg_id, profile in profiles}
+        stored_hashes = self.get_profile_hashes(list(hashes))
+        changed = [(dg_id, profile) for dg_id, profile in profiles if stored_hashes.get(dg_id) != hashes[dg_id]]
+        num_rounds = dict.fromkeys(hashes, 0)
+        num_rounds.update(self.ingest_player_profiles(changed))
+        self.set_sync_states([(dg_id, fetch_date, profile_hash) for dg_id, profile_hash in hashes.items()])
+        return num_rounds
+
+    def ingest_player_profile(self, dg_id, player_profile):
+        return self.ingest_player_profiles([(dg_id, player_profile)])[dg_id]
+
+    @trace_tools.traced()
+    def ingest_player_profiles(self, profiles):
+        """
+        Insert every round in a batch of (dg_id, profile) pairs whose date is not already stored for that player.
+        Courses are inserted with one INSERT OR IGNORE, ids are resolved from in-memory maps and all rounds are
+        written with one executemany in a single transaction.
+        """
+        num_rounds = {dg_id: 0 for dg_id, _ in profiles}
+        if len(num_rounds) == 0:
+            return num_rounds
+        cursor = self.conn.cursor()
+        cursor.execute(f'''SELECT dg_id, date FROM {RoundHistory.table_name} 
+                           WHERE dg_id in ({list_to_query_string([int(i) for i in num_rounds])})''')
+        stored = set(cursor.fetchall())
+        trace_tools.count('sql.rows_read', len(stored))
+
+        # Profiles of a field share most of their event dates and keys, so parse each distinct one once
+        dates = {}
+        ekeys = {}
+        rounds = []
+        for dg_id, profile in profiles:
+            if profile['dg_id'] != dg_id:
+                continue
+            for r in profile['data']:
+                round_date = dates.get(r['date'])
+                if round_date is None:
+                    round_date = dates[r['date']] = utils.text_date_to_int(r['date'])
+                if (dg_id, round_date) not in stored:
+                    rounds.append((dg_id, round_date, r))
+        if len(rounds) == 0:
+            return num_rounds
+
+        with self.write():
+            self.insert_courses([r.get('course_name') for _, _, r in rounds])
+            course_ids = self.get_course_ids()
+            sim_tournament_ids = self.get_sim_tournament_ids()
+            rows = []
+            for dg_id, round_date, r in rounds:
+                key = r.get('key') or ''
+                ekey = ekeys.get(key)
+                if ekey is None:
+                    ekey = ekeys[key] = utils.getSubstringFromIdentifiers(key, 'pga_e_', ';')
+                sim_tournament_id = sim_tournament_ids.get((int(ekey), round_date // 10000)) if ekey.isdigit() else None
+                rows.append((int(dg_id), r.get('total'), r.get('putt'), r.get('arg'), r.get('app'), r.get('ott'),
+                             r.get('round_score'), r.get('round_num'), r.get('fin_numeric'), r.get('fin_text'),
+                             r.get('tour'), course_ids.get(r.get('course_name')), round_date, sim_tournament_id))
+                num_rounds[dg_id] += 1
+            cursor.executemany(f'''INSERT INTO {RoundHistory.table_name} 
+                                   ({list_to_query_string(RoundHistory.columns[1:])}) 
+                                   VALUES ({list_to_query_string(['?'] * (len(RoundHistory.columns) - 1))})''',
+                               rows)
+            self.invalidate_skill_snapshots([dg_id for dg_id, n in num_rounds.items() if n > 0])
+        trace_tools.count('sql.rows_written', len(rows))
+        return num_rounds
@@ -1,12 +1,13 @@
 from datetime import date
 import requests
-from . import utils
+from . import utils, cache_tools, trace_tools
 import json
 from local import keys
 
 
 class API:
     feed_url = 'https://feeds.datagolf.com/'
+    site_url = 'https://datagolf.com/'
     success_status_code = 200
     api_key = keys.dg_api_key
     default_params = {
@@ -14,19 +15,40 @@ class API:
         'file_format': 'json',
         'key': api_key
     }
-
-    def _get(self, endpoint, params=None, base_url=feed_url):
+    # Seconds a cached response stays fresh, by endpoint. Endpoints not listed are always refetched.
+    cache_ttl = {
+        'get-schedule': 6 * 60 * 60,
+        'get-player-list': 6 * 60 * 60,
+        'preds/player-decompositions': 10 * 60,
+        'player-profiles': 60 * 60
+    }
+    pool_size = 16
+
+    def __init__(self, feed_url=None, site_url=None, cache=None, archive=None):
+        if feed_url is not None:
+            self.feed_url = feed_url
+        if site_url is not None:
+            self.site_url = site_url
+        self.cache = cache
+        # archive_tools.ProfileArchive keeping every raw profile response
+        self.archive = archive
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _get(self, endpoint, params=None, base_url=None, before_request=None):
         if params is None:
             params = self.default_params
-        url = base_url + endpoint
-        res = requests.get(url=url, params=params)
-        if res.status_code != self.success_status_code:
-            raise utils.ResponseErrorHTTP(f'Invalid HTTP Status Code from {url}: {res.status_code}')
-        return res.text
+        if base_url is None:
+            base_url = self.feed_url
+        return cache_tools.get_text(self.session, base_url + endpoint, params, self.cache,
+                                    self.cache_ttl.get(endpoint, 0), before_request)
 
+    @trace_tools.traced()
     def get_schedule(self, tour=None):
         endpoint = 'get-schedule'
-        params = self.default_params
+        params = dict(self.default_params)
         if tour is not None:
             params['tour'] = tour
         return json.loads(self._get(endpoint, params))
@@ -46,27 +68,97 @@ class API:
             if i['event_name'] == event_name:
                 return i['event_id']
 
+    @trace_tools.traced()
     def get_player_skill_decomp(self, tour=None):
         endpoint = 'preds/player-decompositions'
-        params = self.default_params
+        params = dict(self.default_params)
         if tour is not None:
             params['tour'] = tour
         return json.loads(self._get(endpoint, params))
 
+    @trace_tools.traced()
     def get_player_names(self):
         endpoint = 'get-player-list'
         return json.loads(self._get(endpoint))
 
-    def get_player_profile(self, dg_id):
-        json_start = 'reload_data = JSON.parse(\''
-        json_end = '\');\n'
-        url = 'https://datagolf.com/player-profiles'
+    @trace_tools.traced()
+    def get_live_stats(self, round=None, stats='sg_total'):
+        endpoint = 'preds/live-tournament-stats'
+        params = dict(self.default_params)
+        params['stats'] = stats
+        if round is not None:
+            params['round'] = round
+        return json.loads(self._get(endpoint, params))
+
+    @trace_tools.traced()
+    def get_player_profile(self, dg_id, before_request=None):
+        """before_request is called before a request is sent, not for a cached response"""
         params = {
             'dg_id': dg_id
         }
-        text = self._get('', params, url)
-        data = utils.getSubstringFromIdentifiers(text, json_start, json_end)
-        return json.loads(data)
+        text = self._get('player-profiles', params, self.site_url, before_request)
+        if self.archive is not None:
+            self.archive.add(dg_id, text)
+        return parse_player_profile(text)
+
+
+def parse_player_profile(text):
+    """Profile JSON embedded in a player-profiles page"""
+    json_start = 'reload_data = JSON.parse(\''
+    json_end = '\');\n'
+    return json.loads(utils.getSubstringFromIdentifiers(text, json_start, json_end))
+
+
+missed_cut_positions = ['CUT', 'MC']
+withdrawn_positions = ['WD', 'DQ']
+
+
+def parse_thru(thru):
+    """Holes completed in the current round from a live stats 'thru' value, 'F' when finished"""
+    if thru == 'F':
+        return 18
+    try:
+        return int(thru)
+    except (TypeError, ValueError):
+        return 0
+
+
+def get_live_scores(api, num_rounds, cut_round=None):
+    """
+    Strokes gained posted so far by each player, from the live stats of every round that has started.
+    Returns ({dg_id: (completed rounds, sg in the round in progress, holes completed in it)}, made_cut, withdrawn)
+    where made_cut lists the dg_ids that made the cut, or is None before the cut, and withdrawn lists the dg_ids that
+    withdrew or were disqualified. The cut has happened once a player is marked as missing it or, given cut_round,
+    once a later round has started.
+    """
+    scores = {}
+    positions = {}
+    rounds_started = 0
+    for r in range(1, num_rounds + 1):
+        stats = api.get_live_stats(r)['live_stats']
+        started = False
+        for p in stats:
+            rounds, current, thru = scores.get(p['dg_id'], ([], 0.0, 0))
+            holes = parse_thru(p.get('thru'))
+            positions[p['dg_id']] = str(p.get('position', ''))
+            if holes == 0 or p.get('sg_total') is None or len(rounds) != r - 1:
+                continue
+            started = True
+            if holes == 18:
+                scores[p['dg_id']] = (rounds + [p['sg_total']], 0.0, 0)
+            else:
+                scores[p['dg_id']] = (rounds, p['sg_total'], holes)
+        if not started:
+            break
+        rounds_started = r
+
+    withdrawn = [dg_id for dg_id, pos in positions.items() if pos in withdrawn_positions]
+    made_cut = None
+    if (any(pos in missed_cut_positions for pos in positions.values())
+            or (cut_round is not None and 0 < cut_round < rounds_started)):
+        made_cut = [dg_id for dg_id, pos in positions.items()
+                    if pos not in missed_cut_positions and pos not in withdrawn_positions]
+    return scores, made_cut, withdrawn
 
 
 # class PlayerList(utils.JsonFile):
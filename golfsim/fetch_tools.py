@@ -0,0 +1,76 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from . import utils
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Allows bursts of up to `burst` requests, refilled at `rate` tokens per second.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ProfileFetcher:
+    """
+    Fetches player profiles on a thread pool, sharing one rate limit across all workers.
+    Results are yielded to the calling thread, which keeps database writes on a single writer. Only requests sent
+    take a token, profiles served from the API's cache do not.
+    """
+    def __init__(self, api, rate, burst=1, max_workers=4, max_retries=3, backoff=1.0):
+        self.api = api
+        self.bucket = TokenBucket(rate, burst)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def _fetch_one(self, dg_id):
+        attempt = 0
+        while True:
+            try:
+                return self.api.get_player_profile(dg_id, self.bucket.acquire)
+            except (utils.ResponseErrorHTTP, requests.RequestException) as e:
+                if attempt >= self.max_retries:
+                    raise
+                wait = self.backoff * 2 ** attempt
+                log.info(f'Fetching profile for {dg_id} failed ({e}), retrying in {wait}s.')
+                time.sleep(wait)
+                attempt += 1
+
+    def fetch(self, dg_ids):
+        """
+        Yield (dg_id, profile, error) in completion order. profile is None if every attempt failed.
+        Profiles not yet being fetched are cancelled if the generator is closed early.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {executor.submit(self._fetch_one, dg_id): dg_id for dg_id in dg_ids}
+            for future in as_completed(futures):
+                dg_id = futures[future]
+                try:
+                    yield dg_id, future.result(), None
+                except Exception as e:
+                    yield dg_id, None, e
+        finally:
+            executor.shutdown(cancel_futures=True)
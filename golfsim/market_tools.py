@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+default_top_ns = [1, 5, 10, 20, 30, 40]
+win_shares = 6  # Sim counts group wins in sixths so dead heats between 2 or 3 players split exactly
+
+
+def position_probabilities(histogram):
+    """Players x positions histogram from Sim.position_histogram to probabilities of each finishing position"""
+    counts = np.asarray(histogram, dtype=np.float64)
+    sims = counts.sum(axis=1, keepdims=True)
+    return np.divide(counts, sims, out=np.zeros_like(counts), where=sims > 0)
+
+
+def top_n_probabilities(histogram, n):
+    """Probability of each player finishing in the top n"""
+    return position_probabilities(histogram)[:, :n].sum(axis=1)
+
+
+def get_position_df(dg_ids, histogram):
+    """Finishing position probabilities with one row per player and one column per position"""
+    probs = position_probabilities(histogram)
+    df = pd.DataFrame(probs, columns=range(1, probs.shape[1] + 1))
+    df.insert(0, 'dg_id', dg_ids)
+    return df
+
+
+def get_placement_markets(dg_ids, histogram, top_ns=None):
+    """Top n probabilities for every n in top_ns, e.g. columns dg_id, top1, top5, ..."""
+    if top_ns is None:
+        top_ns = default_top_ns
+    cum_probs = np.cumsum(position_probabilities(histogram), axis=1)
+    df = pd.DataFrame({'dg_id': dg_ids})
+    for n in top_ns:
+        df[f'top{n}'] = cum_probs[:, min(n, cum_probs.shape[1]) - 1]
+    return df
+
+
+def get_two_ball_df(matchups, pairs=None, dead_heat=True):
+    """
+    Head to head probabilities from Sim.matchups for pairs of (dg_id_a, dg_id_b), all tracked pairs by default.
+    With dead_heat, tied tournaments pay half to each side, otherwise they are left in the tie column.
+    """
+    dg_ids = np.asarray(matchups['dg_ids'])
+    if pairs is None:
+        a, b = np.triu_indices(len(dg_ids), k=1)
+    else:
+        pairs = np.asarray(pairs).reshape(-1, 2)
+        missing = np.setdiff1d(pairs, dg_ids)
+        if len(missing) > 0:
+            raise KeyError(f'Matchups were not tracked for {missing.tolist()}')
+        a = np.searchsorted(dg_ids, pairs[:, 0])
+        b = np.searchsorted(dg_ids, pairs[:, 1])
+
+    sims = matchups['sims']
+    ties = matchups['ties'][a, b] / sims
+    df = pd.DataFrame({
+        'dg_id_a': dg_ids[a],
+        'dg_id_b': dg_ids[b],
+        'win_a': matchups['ahead'][a, b] / sims,
+        'win_b': matchups['ahead'][b, a] / sims,
+        'tie': ties,
+        'both_missed_cut': matchups['both_missed_cut'][a, b] / sims
+    })
+    if dead_heat:
+        df['win_a'] += ties / 2
+        df['win_b'] += ties / 2
+    return df
+
+
+def get_group_df(matchups):
+    """Win probabilities of every player in the 2 and 3 balls registered with Sim.add_matchup_group, dead heats split"""
+    sims = matchups['sims']
+    rows = []
+    for i, group in enumerate(matchups['groups']):
+        for dg_id, shares in zip(group['dg_ids'], group['win_shares']):
+            rows.append({
+                'group': i,
+                'dg_id': dg_id,
+                'win': shares / (win_shares * sims),
+                'all_missed_cut': group['all_missed_cut'] / sims
+            })
+    return pd.DataFrame(rows, columns=['group', 'dg_id', 'win', 'all_missed_cut'])
@@ -1,34 +1,111 @@
-from bs4 import BeautifulSoup
+import re
+import logging
+from html.parser import HTMLParser
 import requests
-from . import utils
-
-# TODO:cleanup
-def get_purse_breakdown(url):
-    response = requests.get(url)
-    if response.status_code != 200:
-        raise utils.ResponseErrorHTTP
-
-    soup = BeautifulSoup(response.text, 'html.parser')
-    tables = soup.find_all('table')
-
-    pay_breakdown = {}
-
-    for table in tables:
-        rows = table.find_all('tr')
-
-        for row in rows:
-            cells = row.find_all(['td', 'th'])
-            cell_data = [cell.get_text(strip=True) for cell in cells]
-            try:
-                pay_breakdown[int(cell_data[0])] = utils.dollars_to_int(cell_data[2])
-            except ValueError:
-                pass
-
-            # TEMP for masters
-            # try:
-            #     pay_breakdown[int(cell_data[0][:-2])] = utils.dollars_to_int(cell_data[1])
-            #     pay_breakdown[int(cell_data[2][:-2])] = utils.dollars_to_int(cell_data[3])
-            # except ValueError:
-            #     pass
-
-    return pay_breakdown
\ No newline at end of file
+from . import utils, cache_tools
+
+log = logging.getLogger(__name__)
+session = requests.Session()
+purse_cache_ttl = 24 * 60 * 60
+
+# Finishing position cells, e.g. 1, T5 or 26th
+position_pattern = re.compile(r'^T?(\d+)(?:st|nd|rd|th)?$', re.IGNORECASE)
+# Payout cells, e.g. $3,600,000 or $20,250.00
+payout_pattern = re.compile(r'^\$\s?[\d,]+(?:\.\d+)?$')
+
+
+class PurseTableParser(HTMLParser):
+    """
+    Collects the payouts of the first table with any, one row at a time. In each row, a position cell is paired with
+    the next payout cell, so both the usual (position, share, payout) rows and the Masters layout of two
+    (position, payout) pairs per row are read in one pass. Cells between a position and its payout are skipped, even
+    if they look like positions, e.g. an integer share.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.payouts = {}
+        self.done = False
+        self._depth = 0
+        self._cells = None
+        self._text = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'table':
+            self._depth += 1
+        elif self._depth == 0:
+            return
+        elif tag == 'tr':
+            self._cells = []
+        elif tag in ('td', 'th') and self._cells is not None:
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if self.done or self._depth == 0:
+            return
+        if tag in ('td', 'th') and self._text is not None:
+            self._cells.append(''.join(self._text).strip())
+            self._text = None
+        elif tag == 'tr' and self._cells is not None:
+            self._add_row(self._cells)
+            self._cells = None
+        elif tag == 'table':
+            self._depth -= 1
+            self.done = self._depth == 0 and len(self.payouts) > 0
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+    def _add_row(self, cells):
+        position = None
+        for cell in cells:
+            if position is None:
+                match = position_pattern.match(cell)
+                if match is not None:
+                    position = int(match.group(1))
+            elif payout_pattern.match(cell):
+                self.payouts[position] = utils.dollars_to_int(cell)
+                position = None
+
+
+def parse_purse_table(text):
+    """{position: payout} from the first payout table in an HTML page"""
+    start = text.find('<table')
+    if start < 0:
+        return {}
+    end = text.rfind('</table>')
+    parser = PurseTableParser()
+    # Without a closing tag, e.g. a truncated page, read what is there
+    parser.feed(text[start:end + len('</table>')] if end > start else text[start:])
+    parser.close()
+    return parser.payouts
+
+
+def get_purse_breakdown(url, cache=None):
+    text = cache_tools.get_text(session, url, cache=cache, ttl=purse_cache_ttl)
+    purse = parse_purse_table(text)
+    if len(purse) == 0:
+        log.warning(f'No purse payouts found at {url}, earnings will be 0')
+    return purse
+
+
+def load_purse(db, sim_tournament_id, url, cache=None):
+    """
+    The purse stored for sim_tournament_id from url, else the purse fetched from url. A fetched purse is stored if the
+    tournament has none yet. A purse stored from another page is kept, as it most likely belongs to last week's
+    tournament and update.py has not added this week's yet. Without a sim_tournament_id nothing is stored.
+    """
+    if sim_tournament_id is None:
+        return get_purse_breakdown(url, cache)
+    purse = db.get_purse(sim_tournament_id, url)
+    if purse is None:
+        purse = get_purse_breakdown(url, cache)
+        if db.get_purse(sim_tournament_id) is not None:
+            log.warning(f'Sim_Tournament {sim_tournament_id} has a purse from another page than {url}, '
+                        f'using {url} without storing it. Run update.py if this is a new tournament.')
+        elif len(purse) > 0:
+            db.set_purse(sim_tournament_id, purse, url)
+    return purse
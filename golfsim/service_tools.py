@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+default_host = '127.0.0.1'
+default_port = 8765
+
+
+class SimService:
+    """
+    A field held in memory with a warm Sim. Changes to the field and simulations are serialized by a lock. Readers
+    never touch the Sim, which is borrowed while it runs. They get encoded JSON snapshots of the results, status and
+    players, which each change publishes under the lock. players: {dg_id: (index, std_dev)},
+    names: optional {dg_id: player_name}.
+    """
+
+    def __init__(self, s, players, num_sims, cut_round, cut_line, names=None):
+        self.sim = s
+        self.seed = s.seed
+        self.players = dict(players)
+        self.names = names or {}
+        self.num_sims = num_sims
+        self.cut_round = cut_round
+        self.cut_line = cut_line
+        self.lock = threading.Lock()
+        self.version = 0
+        # Whether the field or cut changed since the last simulation
+        self.stale = True
+        self.elapsed = None
+        self._results = json.dumps({'version': 0, 'players': {}}).encode()
+        for dg_id, (index, std_dev) in self.players.items():
+            self.sim.add_player(int(dg_id), float(index), float(std_dev))
+        self.sim.set_num_sims(num_sims)
+        self.sim.set_cut_round(cut_round)
+        self.sim.set_cut_line(cut_line)
+        self._publish()
+
+    def _status(self):
+        return {
+            'version': self.version,
+            'stale': self.stale,
+            'num_players': len(self.players),
+            'num_sims': self.num_sims,
+            'cut_round': self.cut_round,
+            'cut_line': self.cut_line,
+            'seed': self.seed,
+            'elapsed': self.elapsed
+        }
+
+    def _publish(self):
+        # Called with the lock held, or from __init__
+        self._status_snapshot = self._status()
+        self._players = json.dumps({dg_id: {'index': index, 'std_dev': std_dev, 'player_name': self.names.get(dg_id)}
+                                    for dg_id, (index, std_dev) in self.players.items()}).encode()
+
+    def status(self):
+        return self._status_snapshot
+
+    def players_json(self):
+        return self._players
+
+    def results(self):
+        """JSON of the last simulation, with one list per results_array column"""
+        return self._results
+
+    def simulate(self, num_sims=None, seed=None):
+        with self.lock:
+            if num_sims is not None:
+                self.num_sims = int(num_sims)
+                self.sim.set_num_sims(self.num_sims)
+            t = time.perf_counter()
+            self.sim.run(None if seed is None else int(seed))
+            self.elapsed = time.perf_counter() - t
+            self.seed = self.sim.seed
+            columns = {k: np.asarray(v).tolist() for k, v in self.sim.results_array().items()}
+            if self.names:
+                columns['player_name'] = [self.names.get(i) for i in columns['dg_id']]
+            self.version += 1
+            self.stale = False
+            self._publish()
+            self._results = json.dumps({**self._status_snapshot, 'players': columns}).encode()
+            return self._status_snapshot
+
+    def adjust_player(self, dg_id, index=None, std_dev=None, withdraw=False):
+        """Withdraws a player, or sets the index and/or std_dev of a player, adding them if both are given"""
+        dg_id = int(dg_id)
+        with self.lock:
+            if withdraw:
+                if dg_id not in self.players:
+                    raise KeyError(f'Player {dg_id} is not in the field')
+                del self.players[dg_id]
+                self.sim.remove_player(dg_id)
+            else:
+                current = self.players.get(dg_id)
+                if current is None and (index is None or std_dev is None):
+                    raise KeyError(f'Player {dg_id} is not in the field, give both index and std_dev to add them')
+                index = float(current[0] if index is None else index)
+                std_dev = float(current[1] if std_dev is None else std_dev)
+                self.players[dg_id] = (index, std_dev)
+                self.sim.add_player(dg_id, index, std_dev)
+            self.stale = True
+            self._publish()
+            return self._status_snapshot
+
+    def set_cut(self, cut_round=None, cut_line=None):
+        with self.lock:
+            # The Sim first, it refuses some cuts
+            if cut_round is not None:
+                self.sim.set_cut_round(int(cut_round))
+                self.cut_round = int(cut_round)
+            if cut_line is not None:
+                self.sim.set_cut_line(int(cut_line))
+                self.cut_line = int(cut_line)
+            self.stale = True
+            self._publish()
+            return self._status_snapshot
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    GET /status, /players and /results. POST JSON to /simulate {num_sims, seed}, /player {dg_id, index, std_dev,
+    withdraw} and /cut {cut_round, cut_line}, each answered with the status.
+    """
+    service = None
+
+    def do_GET(self):
+        if self.path == '/results':
+            self._send(200, self.service.results())
+        elif self.path == '/status':
+            self._send_json(200, self.service.status())
+        elif self.path == '/players':
+            self._send(200, self.service.players_json())
+        else:
+            self._send_json(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        routes = {
+            '/simulate': self.service.simulate,
+            '/player': self.service.adjust_player,
+            '/cut': self.service.set_cut
+        }
+        route = routes.get(self.path)
+        if route is None:
+            self._send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            self._send_json(200, route(**body))
+        except KeyError as e:
+            self._send_json(404, {'error': str(e.args[0]) if e.args else 'Not found'})
+        except (TypeError, ValueError) as e:
+            self._send_json(400, {'error': str(e)})
+
+    def _send_json(self, code, data):
+        self._send(code, json.dumps(data).encode())
+
+    def _send(self, code, body):
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(service, host=default_host, port=default_port):
+    """Threaded HTTP server for service, start it with serve_forever"""
+    handler = type('BoundServiceHandler', (ServiceHandler,), {'service': service})
+    return ThreadingHTTPServer((host, port), handler)
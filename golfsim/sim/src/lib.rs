@@ -1,20 +1,48 @@
+use numpy::{IntoPyArray, PyArray1, PyArray2};
+use pyo3::exceptions::{PyRuntimeError, PyValueError};
 use pyo3::prelude::*;
 use pyo3::types::PyDict;
 use rand::prelude::*;
-use rand_distr::{Distribution, Normal};
+use rand_chacha::ChaCha8Rng;
+use rand_distr::{Distribution, Normal, StandardNormal};
 use std::collections::HashMap;
-use std::sync::{Arc, Mutex};
+use std::sync::atomic::{AtomicU64, AtomicUsize, Ordering};
+use std::sync::Mutex;
 use std::thread;
+use std::time::Instant;
+
+// Tournaments simulated per block in streaming mode
+const DEFAULT_BLOCK_SIZE: usize = 1024;
+// Tournaments drawn from one RNG stream. Block sizes are rounded up to a multiple of this.
+const RNG_BLOCK_SIZE: usize = 256;
+const HOLES_PER_ROUND: usize = 18;
 
 #[pyclass]
 struct Sim {
     players: HashMap<u32, Player>,
+    tallies: HashMap<u32, Tally>,
     data: HashMap<u32, Vec<f32>>,
     purse: HashMap<u32, u32>,
     num_sims: usize,
     num_rounds: usize,
     cut_round: usize,
     cut_line: usize,
+    block_size: usize,
+    track_positions: bool,
+    matchup_ids: Vec<u32>,
+    matchup_groups: Vec<Vec<u32>>,
+    matchups: Option<Matchups>,
+    live: HashMap<u32, LiveScore>,
+    made_cut_ids: Option<Vec<u32>>,
+    record_finishes: bool,
+    // Field of the recorded finishes, sorted by id
+    finish_ids: Vec<u32>,
+    finishes: Vec<FinishBlock>,
+    // Worker threads per run, 0 for one per core
+    threads: usize,
+    timings: Timings,
+    #[pyo3(get, set)]
+    seed: u64,
 }
 
 #[derive(Debug, Clone)]
@@ -38,36 +66,472 @@ pub struct Player {
     pub top20: f32,
     #[pyo3(get)]
     pub made_cut: f32,
+    #[pyo3(get)]
+    pub std_error: f32,
 }
 
 impl Player {
-    fn update_stats(&mut self, finish_pos: f32, cut_line: f32, earnings: f32) {
-        self.avg_finish += finish_pos;
-        if finish_pos <= cut_line + 1.0 {
-            self.avg_earnings += earnings;
-            self.made_cut += 1.0;
-            if finish_pos < 21.0 {
-                self.top20 += 1.0;
-                if finish_pos < 11.0 {
-                    self.top10 += 1.0;
-                    if finish_pos < 6.0 {
-                        self.top5 += 1.0;
-                        if finish_pos < 2.0 {
-                            self.win += 1.0;
+    fn new(index: f32, std_dev: f32) -> Self {
+        Player {
+            index,
+            std_dev,
+            avg_finish: 0.0,
+            avg_earnings: 0.0,
+            win: 0.0,
+            top5: 0.0,
+            top10: 0.0,
+            top20: 0.0,
+            made_cut: 0.0,
+            std_error: 0.0,
+        }
+    }
+
+    fn set_results(&mut self, tally: &Tally) {
+        let sims = tally.sims.max(1) as f64;
+        self.avg_finish = (tally.finish as f64 / sims) as f32;
+        self.avg_earnings = (tally.earnings as f64 / sims) as f32;
+        self.made_cut = (tally.made_cut as f64 / sims) as f32;
+        self.top20 = (tally.top20 as f64 / sims) as f32;
+        self.top10 = (tally.top10 as f64 / sims) as f32;
+        self.top5 = (tally.top5 as f64 / sims) as f32;
+        self.win = (tally.win as f64 / sims) as f32;
+        self.std_error = tally.std_error() as f32;
+    }
+}
+
+/// Integer outcome counts for one player. Integer sums make the merged results independent of how
+/// blocks were split between threads.
+#[derive(Debug, Clone, Default, PartialEq)]
+struct Tally {
+    sims: u64,
+    finish: u64,
+    earnings: u64,
+    made_cut: u64,
+    top20: u64,
+    top10: u64,
+    top5: u64,
+    win: u64,
+    // Times finished in each position, starting at 1st. Empty unless positions are tracked.
+    positions: Vec<u32>,
+}
+
+impl Tally {
+    fn new(num_positions: usize) -> Self {
+        Tally {
+            positions: vec![0; num_positions],
+            ..Default::default()
+        }
+    }
+
+    fn update(&mut self, finish_pos: usize, cut_line: usize, earnings: u64) {
+        self.sims += 1;
+        if let Some(count) = self.positions.get_mut(finish_pos - 1) {
+            *count += 1;
+        }
+        self.finish += finish_pos as u64;
+        if finish_pos <= cut_line + 1 {
+            self.earnings += earnings;
+            self.made_cut += 1;
+            if finish_pos <= 20 {
+                self.top20 += 1;
+                if finish_pos <= 10 {
+                    self.top10 += 1;
+                    if finish_pos <= 5 {
+                        self.top5 += 1;
+                        if finish_pos <= 1 {
+                            self.win += 1;
                         }
                     }
                 }
             }
         }
     }
+
+    /// Largest Monte Carlo standard error of the win, top N and made cut estimates. Counts are shrunk
+    /// by half a sim towards 1/2 so that an event never seen yet does not report zero error.
+    fn std_error(&self) -> f64 {
+        if self.sims == 0 {
+            return f64::INFINITY;
+        }
+        let n = self.sims as f64;
+        [self.win, self.top5, self.top10, self.top20, self.made_cut]
+            .iter()
+            .map(|&x| {
+                let p = (x as f64 + 0.5) / (n + 1.0);
+                (p * (1.0 - p) / n).sqrt()
+            })
+            .fold(0.0, f64::max)
+    }
+
+    fn add(&mut self, other: &Tally) {
+        self.sims += other.sims;
+        self.finish += other.finish;
+        self.earnings += other.earnings;
+        self.made_cut += other.made_cut;
+        self.top20 += other.top20;
+        self.top10 += other.top10;
+        self.top5 += other.top5;
+        self.win += other.win;
+        if self.positions.len() < other.positions.len() {
+            self.positions.resize(other.positions.len(), 0);
+        }
+        for (count, other_count) in self.positions.iter_mut().zip(&other.positions) {
+            *count += other_count;
+        }
+    }
+}
+
+/// Time spent in each phase of the simulation, summed over runs until `take_timings`
+#[derive(Debug, Clone, Default)]
+struct Timings {
+    tournaments: u64,
+    // Wall time of sim_rounds
+    draw_ns: u64,
+    // Worker thread time writing rounds into blocks
+    generate_ns: u64,
+    // Worker thread time ranking and tallying
+    score_ns: u64,
+    // Wall time of score_blocks
+    wall_ns: u64,
+}
+
+impl Timings {
+    fn add(&mut self, other: &Timings) {
+        self.tournaments += other.tournaments;
+        self.draw_ns += other.draw_ns;
+        self.generate_ns += other.generate_ns;
+        self.score_ns += other.score_ns;
+        self.wall_ns += other.wall_ns;
+    }
+}
+
+/// Finishing position of every player in a run of consecutive tournaments, `positions[slot * num_sims + i]`
+/// for tournament `first_sim + i`
+struct FinishBlock {
+    first_sim: usize,
+    num_sims: usize,
+    positions: Vec<u16>,
+}
+
+/// Output of `Sim::score_blocks`
+struct Scored {
+    // One accumulator per worker
+    tallies: Vec<(Vec<Tally>, Option<Matchups>)>,
+    // Empty unless finishes are recorded
+    finishes: Vec<FinishBlock>,
+    timings: Timings,
+}
+
+/// Scores of one tournament in struct-of-arrays layout: `cum[r * num_players + p]` is the cumulative
+/// score of player slot `p` after round `r + 1`.
+struct TournamentScores {
+    num_players: usize,
+    num_rounds: usize,
+    cum: Vec<f32>,
+}
+
+impl TournamentScores {
+    fn new(num_players: usize, num_rounds: usize) -> Self {
+        TournamentScores {
+            num_players,
+            num_rounds,
+            cum: vec![0.0; num_players * num_rounds],
+        }
+    }
+
+    fn set_player(&mut self, p: usize, rounds: &[f32]) {
+        let mut total = 0.0;
+        for (r, score) in rounds.iter().enumerate() {
+            total += score;
+            self.cum[r * self.num_players + p] = total;
+        }
+    }
+
+    fn after_round(&self, round: usize) -> &[f32] {
+        &self.cum[(round - 1) * self.num_players..round * self.num_players]
+    }
+}
+
+fn descending(a: f32, b: f32) -> std::cmp::Ordering {
+    b.partial_cmp(&a).unwrap_or(std::cmp::Ordering::Equal)
+}
+
+/// Ranks tournaments by player slot, reusing its order buffer between tournaments.
+struct Ranker {
+    order: Vec<u32>,
+}
+
+impl Ranker {
+    fn new(num_players: usize) -> Self {
+        Ranker {
+            order: Vec::with_capacity(num_players),
+        }
+    }
+
+    /// Returns the finishing order of the player slots, best first. With a cut, the top `cut_line` players
+    /// after `cut_round` are selected in O(n) and sorted by total, the rest follow in order of their cut score.
+    /// Ties are broken by cut order then slot, which reproduces the stable sorts of `simulate_tournament`.
+    fn rank(&mut self, scores: &TournamentScores, cut_round: usize, cut_line: usize) -> &[u32] {
+        let n = scores.num_players;
+        let total = scores.after_round(scores.num_rounds);
+        let order = &mut self.order;
+        order.clear();
+        order.extend(0..n as u32);
+
+        if cut_round > 0 {
+            let cut = scores.after_round(cut_round);
+            let by_cut = |a: &u32, b: &u32| descending(cut[*a as usize], cut[*b as usize]).then(a.cmp(b));
+            let split = cut_line.min(n);
+            if split < n {
+                order.select_nth_unstable_by(split, by_cut);
+                order[split..].sort_unstable_by(by_cut);
+            }
+            order[..split].sort_unstable_by(|a, b| {
+                descending(total[*a as usize], total[*b as usize]).then_with(|| by_cut(a, b))
+            });
+        } else {
+            order.sort_unstable_by(|a, b| descending(total[*a as usize], total[*b as usize]).then(a.cmp(b)));
+        }
+        order
+    }
+
+    /// Like `rank` for a cut that has already been made: the slots flagged in `made_cut` are sorted by total,
+    /// the rest follow in order of their score after `cut_round`.
+    fn rank_made_cut(&mut self, scores: &TournamentScores, cut_round: usize, made_cut: &[bool]) -> &[u32] {
+        let n = scores.num_players;
+        let total = scores.after_round(scores.num_rounds);
+        let cut = scores.after_round(cut_round);
+        let by_cut = |a: &u32, b: &u32| descending(cut[*a as usize], cut[*b as usize]).then(a.cmp(b));
+        let order = &mut self.order;
+        order.clear();
+        order.extend((0..n as u32).filter(|p| made_cut[*p as usize]));
+        let split = order.len();
+        order.extend((0..n as u32).filter(|p| !made_cut[*p as usize]));
+        order[split..].sort_unstable_by(by_cut);
+        order[..split].sort_unstable_by(|a, b| {
+            descending(total[*a as usize], total[*b as usize]).then_with(|| by_cut(a, b))
+        });
+        order
+    }
+}
+
+/// Strokes gained a player has already posted during the event: every completed round, and `current` through
+/// `thru` holes of the round in progress.
+#[derive(Debug, Clone)]
+struct LiveScore {
+    rounds: Vec<f32>,
+    current: f32,
+    thru: usize,
+}
+
+// Dead heats split a win between up to 3 players, so group wins are counted in sixths
+const WIN_SHARES: u64 = 6;
+
+/// Joint outcomes of the tracked players. `ahead[i * k + j]` counts tournaments where tracked player `i`
+/// finished strictly ahead of `j`, `ties` those where their deciding scores were equal and `both_missed_cut`
+/// those where neither made the cut. Players who made the cut are decided on total score, players who both
+/// missed on their score at the cut, which is also how the finishing order ranks them.
+#[derive(Debug, Clone)]
+struct Matchups {
+    ids: Vec<u32>,
+    sims: u64,
+    ahead: Vec<u32>,
+    ties: Vec<u32>,
+    both_missed_cut: Vec<u32>,
+    groups: Vec<Group>,
+}
+
+/// A registered 2 or 3 ball. `win_shares` counts wins in 1/WIN_SHARES units, split between tied players.
+#[derive(Debug, Clone)]
+struct Group {
+    ids: Vec<u32>,
+    win_shares: Vec<u64>,
+    all_missed_cut: u64,
+}
+
+impl Matchups {
+    fn new(ids: &[u32], groups: &[Vec<u32>]) -> Self {
+        let k = ids.len();
+        Matchups {
+            ids: ids.to_vec(),
+            sims: 0,
+            ahead: vec![0; k * k],
+            ties: vec![0; k * k],
+            both_missed_cut: vec![0; k * k],
+            groups: groups
+                .iter()
+                .map(|g| Group { ids: g.clone(), win_shares: vec![0; g.len()], all_missed_cut: 0 })
+                .collect(),
+        }
+    }
+
+    fn add(&mut self, other: &Matchups) {
+        self.sims += other.sims;
+        for (count, other_count) in self.ahead.iter_mut().zip(&other.ahead) {
+            *count += other_count;
+        }
+        for (count, other_count) in self.ties.iter_mut().zip(&other.ties) {
+            *count += other_count;
+        }
+        for (count, other_count) in self.both_missed_cut.iter_mut().zip(&other.both_missed_cut) {
+            *count += other_count;
+        }
+        for (group, other_group) in self.groups.iter_mut().zip(&other.groups) {
+            for (shares, other_shares) in group.win_shares.iter_mut().zip(&other_group.win_shares) {
+                *shares += other_shares;
+            }
+            group.all_missed_cut += other_group.all_missed_cut;
+        }
+    }
+}
+
+/// Accumulates `Matchups` for one worker, with the tracked players mapped to field slots.
+struct MatchupCounter {
+    slots: Vec<usize>,
+    group_slots: Vec<Vec<usize>>,
+    pos: Vec<usize>,
+    counts: Matchups,
+}
+
+impl MatchupCounter {
+    fn new(field: &[(u32, Player)], template: &Matchups) -> Self {
+        // Field is sorted by id and every tracked id was checked against the players when registered
+        let slot = |id: &u32| field.binary_search_by_key(id, |(field_id, _)| *field_id).unwrap();
+        MatchupCounter {
+            slots: template.ids.iter().map(slot).collect(),
+            group_slots: template.groups.iter().map(|g| g.ids.iter().map(slot).collect()).collect(),
+            pos: vec![0; field.len()],
+            counts: template.clone(),
+        }
+    }
+
+    fn update(&mut self, order: &[u32], scores: &TournamentScores, cut_round: usize, num_made_cut: usize) {
+        for (pos, &p) in order.iter().enumerate() {
+            self.pos[p as usize] = pos;
+        }
+        let total = scores.after_round(scores.num_rounds);
+        let cut = if cut_round > 0 { scores.after_round(cut_round) } else { total };
+        let pos = &self.pos;
+        let made_cut = |s: usize| pos[s] < num_made_cut;
+        let score = |s: usize| if made_cut(s) { total[s] } else { cut[s] };
+        let tied = |a: usize, b: usize| made_cut(a) == made_cut(b) && score(a) == score(b);
+
+        let counts = &mut self.counts;
+        counts.sims += 1;
+        let k = self.slots.len();
+        for i in 0..k {
+            let a = self.slots[i];
+            for j in i + 1..k {
+                let b = self.slots[j];
+                if tied(a, b) {
+                    counts.ties[i * k + j] += 1;
+                    counts.ties[j * k + i] += 1;
+                } else if pos[a] < pos[b] {
+                    counts.ahead[i * k + j] += 1;
+                } else {
+                    counts.ahead[j * k + i] += 1;
+                }
+                if !made_cut(a) && !made_cut(b) {
+                    counts.both_missed_cut[i * k + j] += 1;
+                    counts.both_missed_cut[j * k + i] += 1;
+                }
+            }
+        }
+
+        for (group, slots) in counts.groups.iter_mut().zip(&self.group_slots) {
+            let best = *slots.iter().min_by_key(|&&s| pos[s]).unwrap();
+            let num_tied = slots.iter().filter(|&&s| tied(s, best)).count() as u64;
+            for (shares, &s) in group.win_shares.iter_mut().zip(slots) {
+                if tied(s, best) {
+                    *shares += WIN_SHARES / num_tied;
+                }
+            }
+            if !made_cut(best) {
+                group.all_missed_cut += 1;
+            }
+        }
+    }
+}
+
+fn update_tallies(tallies: &mut [Tally], order: &[u32], cut_line: usize, payouts: &[u64]) {
+    for (pos, &p) in order.iter().enumerate() {
+        tallies[p as usize].update(pos + 1, cut_line, payouts[pos]);
+    }
+}
+
+/// Smallest positive multiple of RNG_BLOCK_SIZE that is at least `num_sims`
+fn round_to_rng_blocks(num_sims: usize) -> usize {
+    (num_sims.max(1) + RNG_BLOCK_SIZE - 1) / RNG_BLOCK_SIZE * RNG_BLOCK_SIZE
+}
+
+/// Fills `out` with standard normal round scores for player `id`, starting at tournament `first_sim`, which
+/// must be a multiple of RNG_BLOCK_SIZE. Every RNG block of every player has its own ChaCha stream, so a draw
+/// depends only on (seed, id, tournament) and not on the field, block size or thread that produced it.
+fn draw_rounds(seed: u64, id: u32, first_sim: usize, num_rounds: usize, out: &mut [f32]) {
+    let rng_block_len = RNG_BLOCK_SIZE * num_rounds;
+    for (k, chunk) in out.chunks_mut(rng_block_len).enumerate() {
+        let mut rng = ChaCha8Rng::seed_from_u64(seed);
+        rng.set_stream(((id as u64) << 32) | (first_sim / RNG_BLOCK_SIZE + k) as u64);
+        for z in chunk.iter_mut() {
+            *z = StandardNormal.sample(&mut rng);
+        }
+    }
+}
+
+fn scale_rounds(player: &Player, rounds: &mut [f32]) {
+    for score in rounds.iter_mut() {
+        *score = player.index + player.std_dev * *score;
+    }
+}
+
+/// Fills `rounds` for a player with posted scores. Only the rounds not yet completed are drawn, the round in
+/// progress adds a draw for the remaining holes with mean and variance in proportion to the holes left.
+fn fill_live_rounds(seed: u64, id: u32, first_sim: usize, player: &Player, live: &LiveScore, num_rounds: usize,
+                    rounds: &mut [f32]) {
+    let done = live.rounds.len();
+    let open = num_rounds - done;
+    let num_sims = rounds.len() / num_rounds;
+    if open > 0 {
+        draw_rounds(seed, id, first_sim, open, &mut rounds[..num_sims * open]);
+    }
+
+    // Spread the draws out to num_rounds per tournament, back to front so no draw is overwritten before it is read
+    let remaining = (HOLES_PER_ROUND - live.thru) as f32 / HOLES_PER_ROUND as f32;
+    let remaining_sd = player.std_dev * remaining.sqrt();
+    for t in (0..num_sims).rev() {
+        for r in (0..num_rounds).rev() {
+            rounds[t * num_rounds + r] = if r < done {
+                live.rounds[r]
+            } else {
+                let z = rounds[t * open + r - done];
+                if r == done && live.thru > 0 {
+                    live.current + player.index * remaining + remaining_sd * z
+                } else {
+                    player.index + player.std_dev * z
+                }
+            };
+        }
+    }
 }
 
 impl Sim {
-    fn simulate_player_rounds(&self, player: &Player, size: usize, rng: &mut ThreadRng) -> Vec<f32> {
-        let normal = Normal::new(player.index, player.std_dev).unwrap();
-        (0..size).map(|_| normal.sample(rng)).collect()
+    fn simulate_player_rounds(&self, id: u32, player: &Player, num_sims: usize) -> Vec<f32> {
+        let mut rounds = vec![0.0; num_sims * self.num_rounds];
+        self.fill_player_rounds(id, player, 0, &mut rounds);
+        rounds
+    }
+
+    fn fill_player_rounds(&self, id: u32, player: &Player, first_sim: usize, rounds: &mut [f32]) {
+        match self.live.get(&id) {
+            Some(live) => fill_live_rounds(self.seed, id, first_sim, player, live, self.num_rounds, rounds),
+            None => {
+                draw_rounds(self.seed, id, first_sim, self.num_rounds, rounds);
+                scale_rounds(player, rounds);
+            }
+        }
     }
 
+    // Reference ranking, superseded by Ranker. Kept so bench_ranking can check that both agree.
     fn simulate_tournament(&self, tournament_data: &[(u32, Vec<f32>)]) -> Vec<(u32, Vec<f32>)> {
         let mut tournament: Vec<(u32, Vec<f32>)> = tournament_data.to_vec();
     
@@ -98,171 +562,478 @@ impl Sim {
         tournament
     }
 
-    fn update_player_stats(&self, tournament: &[(u32, Vec<f32>)], players: &mut HashMap<u32, Player>, purse: &HashMap<u32, u32>) {
-        for (pos, &(id, _)) in tournament.iter().enumerate() {
-            if let Some(player) = players.get_mut(&id) {
-                let fin = pos as f32 + 1.0;
-                let mut e: f32 = 0.0;
-                if let Some(earnings) = purse.get(&(fin as u32)) {
-                    e = *earnings as f32;
-                }
-                player.update_stats(fin, self.cut_line as f32, e);
-            }
+    fn num_threads(&self) -> usize {
+        match self.threads {
+            0 => thread::available_parallelism().map_or(1, |n| n.get()),
+            n => n,
         }
     }
 
-    fn update_player_stats_from_thread(&mut self, t_players: &Vec<HashMap<u32, Player>> ) {
-        for t in t_players {
-            for (id, player) in t {
-                if let Some(p) = self.players.get_mut(&id) {
-                    p.avg_finish += player.avg_finish;
-                    p.made_cut += player.made_cut;
-                    p.avg_earnings += player.avg_earnings;
-                    p.top20 += player.top20;
-                    p.top10 += player.top10;
-                    p.top5 += player.top5;
-                    p.win += player.win;
+    fn sorted_field(&self) -> Vec<(u32, Player)> {
+        let mut field: Vec<(u32, Player)> = self.players
+            .iter()
+            .map(|(id, p)| (*id, Player::new(p.index, p.std_dev)))
+            .collect();
+        field.sort_by_key(|&(id, _)| id);
+        field
+    }
+
+    // Purse by finishing position, starting at 1st
+    fn payouts(&self, num_players: usize) -> Vec<u64> {
+        (1..=num_players as u32)
+            .map(|pos| self.purse.get(&pos).map_or(0, |pay| *pay as u64))
+            .collect()
+    }
+
+    /// Ranks and scores tournaments `first_sim..first_sim + num_sims` on all cores, one block at a time,
+    /// returning one accumulator per worker, each block's finishes if they are recorded and the time spent.
+    /// `first_sim` must be a multiple of RNG_BLOCK_SIZE.
+    /// `generate(start, block_sims, block)` writes the rounds of the block starting at tournament `start` into
+    /// `block`, laid out as `[player slot][tournament][round]` with `block_size * num_rounds` values per player.
+    fn score_blocks<G>(&self, field: &[(u32, Player)], first_sim: usize, num_sims: usize, generate: G) -> Scored
+    where
+        G: Fn(usize, usize, &mut [f32]) + Sync,
+    {
+        let num_threads = self.num_threads();
+        let num_players = field.len();
+        let num_rounds = self.num_rounds;
+        let block_size = self.block_size;
+        let stride = block_size * num_rounds;
+        let num_blocks = (num_sims + block_size - 1) / block_size;
+        let payouts = self.payouts(num_players);
+        // With the cut already made, exactly the players who made it count as making it (Tally counts
+        // positions up to cut_line + 1)
+        let made_cut: Option<Vec<bool>> = self.made_cut_ids.as_ref()
+            .map(|ids| field.iter().map(|(id, _)| ids.binary_search(id).is_ok()).collect());
+        let (cut_line, num_made_cut) = match &made_cut {
+            Some(made) => {
+                let count = made.iter().filter(|m| **m).count();
+                (count.saturating_sub(1), count)
+            }
+            None if self.cut_round > 0 => (self.cut_line, self.cut_line.min(num_players)),
+            None => (self.cut_line, num_players),
+        };
+        let next_block = AtomicUsize::new(0);
+        let results = Mutex::new(Vec::new());
+        let finishes = Mutex::new(Vec::new());
+        let generate_ns = AtomicU64::new(0);
+        let score_ns = AtomicU64::new(0);
+        let start = Instant::now();
+
+        thread::scope(|s| {
+            for _ in 0..num_threads.min(num_blocks) {
+                s.spawn(|| {
+                    let num_positions = if self.track_positions { num_players } else { 0 };
+                    let mut tallies = vec![Tally::new(num_positions); num_players];
+                    let mut block = vec![0.0; num_players * stride];
+                    let mut scores = TournamentScores::new(num_players, num_rounds);
+                    let mut ranker = Ranker::new(num_players);
+                    let mut matchups = self.matchup_template().map(|m| MatchupCounter::new(field, &m));
+                    let (mut thread_generate_ns, mut thread_score_ns) = (0, 0);
+                    loop {
+                        let b = next_block.fetch_add(1, Ordering::Relaxed);
+                        if b >= num_blocks {
+                            break;
+                        }
+                        let block_sims = block_size.min(num_sims - b * block_size);
+                        let block_start = Instant::now();
+                        generate(first_sim + b * block_size, block_sims, &mut block);
+                        let generated = Instant::now();
+                        thread_generate_ns += (generated - block_start).as_nanos() as u64;
+                        let mut positions = if self.record_finishes { vec![0; num_players * block_sims] } else { Vec::new() };
+                        for i in 0..block_sims {
+                            for p in 0..num_players {
+                                let start = p * stride + i * num_rounds;
+                                scores.set_player(p, &block[start..start + num_rounds]);
+                            }
+                            let order = match &made_cut {
+                                Some(made) => ranker.rank_made_cut(&scores, self.cut_round, made),
+                                None => ranker.rank(&scores, self.cut_round, self.cut_line),
+                            };
+                            update_tallies(&mut tallies, order, cut_line, &payouts);
+                            if let Some(m) = matchups.as_mut() {
+                                m.update(order, &scores, self.cut_round, num_made_cut);
+                            }
+                            if self.record_finishes {
+                                for (pos, &p) in order.iter().enumerate() {
+                                    positions[p as usize * block_sims + i] = (pos + 1).min(u16::MAX as usize) as u16;
+                                }
+                            }
+                        }
+                        if self.record_finishes {
+                            finishes.lock().unwrap().push(FinishBlock { first_sim: first_sim + b * block_size, num_sims: block_sims, positions });
+                        }
+                        thread_score_ns += generated.elapsed().as_nanos() as u64;
+                    }
+                    generate_ns.fetch_add(thread_generate_ns, Ordering::Relaxed);
+                    score_ns.fetch_add(thread_score_ns, Ordering::Relaxed);
+                    results.lock().unwrap().push((tallies, matchups.map(|m| m.counts)));
+                });
+            }
+        });
+        let timings = Timings {
+            tournaments: num_sims as u64,
+            generate_ns: generate_ns.into_inner(),
+            score_ns: score_ns.into_inner(),
+            wall_ns: start.elapsed().as_nanos() as u64,
+            ..Default::default()
+        };
+        Scored { tallies: results.into_inner().unwrap(), finishes: finishes.into_inner().unwrap(), timings }
+    }
+
+    fn stream_batch(&mut self, field: &[(u32, Player)], first_sim: usize, num_sims: usize) {
+        let stride = self.block_size * self.num_rounds;
+        let scored = self.score_blocks(field, first_sim, num_sims, |start, block_sims, block| {
+            let len = block_sims * self.num_rounds;
+            for (p, (id, player)) in field.iter().enumerate() {
+                let rounds = &mut block[p * stride..p * stride + len];
+                self.fill_player_rounds(*id, player, start, rounds);
+            }
+        });
+        self.update_player_stats_from_thread(field, scored);
+    }
+
+    fn max_std_error(&self) -> f64 {
+        self.tallies.values().map(|t| t.std_error()).fold(0.0, f64::max)
+    }
+
+    fn update_player_stats_from_thread(&mut self, field: &[(u32, Player)], scored: Scored) {
+        for (t, matchups) in scored.tallies.iter() {
+            for ((id, _), tally) in field.iter().zip(t) {
+                self.tallies.entry(*id).or_default().add(tally);
+            }
+            if let Some(m) = matchups {
+                match self.matchups.as_mut() {
+                    Some(total) => total.add(m),
+                    None => self.matchups = Some(m.clone()),
                 }
             }
         }
+        if !scored.finishes.is_empty() {
+            self.finish_ids = field.iter().map(|(id, _)| *id).collect();
+            self.finishes.extend(scored.finishes);
+        }
+        self.timings.add(&scored.timings);
+    }
+
+    fn matchup_template(&self) -> Option<Matchups> {
+        if self.matchup_ids.is_empty() && self.matchup_groups.is_empty() {
+            return None;
+        }
+        Some(Matchups::new(&self.matchup_ids, &self.matchup_groups))
+    }
+
+    // Ranking reads the scores after cut_round, a cut already made needs one
+    fn check_cut(&self) -> PyResult<()> {
+        if self.cut_round > self.num_rounds {
+            return Err(PyValueError::new_err(format!("cut_round {} is after the last round, {}", self.cut_round, self.num_rounds)));
+        }
+        if self.cut_round == 0 && self.made_cut_ids.is_some() {
+            return Err(PyValueError::new_err("A cut has been made but cut_round is 0, call set_made_cut(None) first"));
+        }
+        Ok(())
+    }
+
+    fn check_players(&self, dg_ids: &[u32]) -> PyResult<()> {
+        match dg_ids.iter().find(|id| !self.players.contains_key(id)) {
+            Some(id) => Err(PyValueError::new_err(format!("Player {} has not been added", id))),
+            None => Ok(()),
+        }
     }
 
     fn normalize_results(&mut self) {
-        let num_sims = self.num_sims as f32;
-        for player in self.players.values_mut() {
-            player.avg_finish /= num_sims;
-            player.made_cut /= num_sims;
-            player.avg_earnings /= num_sims;
-            player.top20 /= num_sims;
-            player.top10 /= num_sims;
-            player.top5 /= num_sims;
-            player.win /= num_sims;
+        for (id, player) in self.players.iter_mut() {
+            if let Some(tally) = self.tallies.get(id) {
+                player.set_results(tally);
+            }
         }
     }
+
+    // Body of run_until, which calls it without the GIL. Batches are rounded up to whole RNG blocks.
+    fn run_batches(&mut self, tolerance: f64, max_sims: usize, batch_size: usize) -> bool {
+        let batch_size = round_to_rng_blocks(batch_size);
+        let field = self.sorted_field();
+        self.reset_results();
+        let mut sims = 0;
+        let mut converged = field.is_empty();
+        while !converged && sims < max_sims {
+            let batch_sims = batch_size.min(max_sims - sims);
+            self.stream_batch(&field, sims, batch_sims);
+            sims += batch_sims;
+            converged = self.max_std_error() <= tolerance;
+        }
+        self.calculate_results();
+        converged
+    }
+
+    // Body of run, which calls it without the GIL
+    fn run_seeded(&mut self, seed: Option<u64>) {
+        if let Some(seed) = seed {
+            self.seed = seed;
+        }
+        self.reset_results();
+        let field = self.sorted_field();
+        self.stream_batch(&field, 0, self.num_sims);
+        self.calculate_results();
+    }
 }
 
 #[pymethods]
 impl Sim {
+    /// Without a seed, one is drawn at random. It can be read back from `seed` to reproduce the run.
     #[new]
-    fn new(num_sims: usize, num_rounds: usize, cut_round: usize, cut_line: usize) -> Self {
+    #[pyo3(signature = (num_sims, num_rounds, cut_round, cut_line, seed = None))]
+    fn new(num_sims: usize, num_rounds: usize, cut_round: usize, cut_line: usize, seed: Option<u64>) -> Self {
         Sim {
             players: HashMap::new(),
+            tallies: HashMap::new(),
             data: HashMap::new(),
             purse: HashMap::new(),
             num_sims,
             num_rounds,
             cut_round,
             cut_line,
+            block_size: DEFAULT_BLOCK_SIZE,
+            track_positions: false,
+            matchup_ids: Vec::new(),
+            matchup_groups: Vec::new(),
+            matchups: None,
+            live: HashMap::new(),
+            made_cut_ids: None,
+            record_finishes: false,
+            finish_ids: Vec::new(),
+            finishes: Vec::new(),
+            threads: 0,
+            timings: Timings::default(),
+            seed: seed.unwrap_or_else(|| thread_rng().gen()),
         }
     }
 
     fn add_player(&mut self, id: u32, sg_index: f32, std_dev: f32) {
-        let player = Player {
-            index: sg_index,
-            std_dev,
-            avg_finish: 0.0,
-            avg_earnings: 0.0,
-            win: 0.0,
-            top5: 0.0,
-            top10: 0.0,
-            top20: 0.0,
-            made_cut: 0.0
-        };
-        self.players.insert(id, player);
+        self.players.insert(id, Player::new(sg_index, std_dev));
+    }
+
+    /// Takes a player out of the field, e.g. a withdrawal, along with their results, live score and matchups.
+    /// Returns whether they were in the field.
+    fn remove_player(&mut self, id: u32) -> bool {
+        self.tallies.remove(&id);
+        self.data.remove(&id);
+        self.live.remove(&id);
+        if let Some(ids) = self.made_cut_ids.as_mut() {
+            ids.retain(|i| *i != id);
+        }
+        self.matchup_ids.retain(|i| *i != id);
+        self.matchup_groups.retain(|group| !group.contains(&id));
+        self.players.remove(&id).is_some()
     }
 
     fn sim_rounds(&mut self) {
-        let num_threads = thread::available_parallelism().unwrap().get();
-        let size = self.num_sims * self.num_rounds;
-        let players = Arc::new(self.players.clone());
-        let data = Arc::new(Mutex::new(HashMap::new()));
+        let start = Instant::now();
+        let num_threads = self.num_threads();
+        let field = self.sorted_field();
+        let data = Mutex::new(HashMap::new());
 
         thread::scope(|s| {
             for t in 0..num_threads {
-                let players = Arc::clone(&players);
-                let data = Arc::clone(&data);
-                let num_rounds = self.num_rounds;
+                let field = &field;
+                let data = &data;
+                let sim = &*self;
                 s.spawn(move || {
-                    let mut rng = thread_rng();
-                    for (id, player) in players.iter() {
-                        if *id as usize % num_threads == t {
-                            let random_data = Self::simulate_player_rounds(&Self::new(0, num_rounds, 0, 0), player, size, &mut rng);
-                            data.lock().unwrap().insert(*id, random_data);
-                        }
+                    for (id, player) in field.iter().skip(t).step_by(num_threads) {
+                        let random_data = sim.simulate_player_rounds(*id, player, sim.num_sims);
+                        data.lock().unwrap().insert(*id, random_data);
                     }
                 });
             }
         });
 
-        self.data = Arc::try_unwrap(data).unwrap().into_inner().unwrap();
-    }
-
-    fn sim_tournaments(&mut self) {
-        let num_threads = thread::available_parallelism().unwrap().get();
-        let original_players = Arc::new(self.players.clone());
-        let data_chunks: Vec<Vec<(u32, Vec<f32>)>> = {
-            let mut data_vec: Vec<(u32, Vec<f32>)> = self.data.clone().into_iter().collect();
-            let total_sims = self.num_sims * self.num_rounds;
-            let chunk_size = (total_sims + num_threads - 1) / num_threads;
-            let mut chunks = Vec::new();
-        
-            for _ in 0..num_threads {
-                let mut chunk = Vec::new();
-                for (id, scores) in data_vec.iter_mut() {
-                    let chunk_scores = scores.split_off(scores.len() - chunk_size);
-                    chunk.push((*id, chunk_scores));
-                }
-                chunks.push(chunk);
-            }
-        
-            chunks
-        };
-    
-        let purse = self.purse.clone();
-        let num_rounds = self.num_rounds;
-        let num_thread_sims = self.num_sims * self.num_rounds / num_threads;
-        let cut_round = self.cut_round;
-        let cut_line = self.cut_line;
+        self.data = data.into_inner().unwrap();
+        self.timings.draw_ns += start.elapsed().as_nanos() as u64;
+    }
 
-        let thread_players: Arc<Mutex<Vec<HashMap<u32, Player>>>> = Arc::new(Mutex::new(vec![HashMap::new(); num_threads]));
-    
-        thread::scope(|s| {
-            for (t, data_chunk) in data_chunks.into_iter().enumerate() {
-                let original_players = Arc::clone(&original_players);
-                let purse = purse.clone();
-                let mut players = original_players.iter().map(|(id, p)| (*id, p.clone())).collect();
-                let thread_players = Arc::clone(&thread_players);
-                let sim = Self::new(0, num_rounds, cut_round, cut_line);
-                s.spawn(move || {
-                    for i in (0..num_thread_sims).step_by(num_rounds) {
-                        let tournament_data: Vec<(u32, Vec<f32>)> = data_chunk
-                            .iter()
-                            .map(|&(id, ref scores)| (id, scores[i..i + num_rounds].to_vec()))
-                            .collect();
-                        let tournament = sim.simulate_tournament(&tournament_data);
-                        sim.update_player_stats(&tournament, &mut players, &purse);
-                    }
-                    thread_players.lock().unwrap()[t] = players;
-                });
+    fn sim_tournaments(&mut self) -> PyResult<()> {
+        self.check_cut()?;
+        let field = self.sorted_field();
+        let size = self.num_sims * self.num_rounds;
+        let mut data: Vec<&[f32]> = Vec::with_capacity(field.len());
+        for (id, _) in field.iter() {
+            match self.data.get(id) {
+                Some(rounds) if rounds.len() >= size => data.push(rounds),
+                _ => return Err(PyRuntimeError::new_err(format!("No simulated rounds for player {}, run sim_rounds first", id))),
+            }
+        }
+        let stride = self.block_size * self.num_rounds;
+        let scored = self.score_blocks(&field, 0, self.num_sims, |start, block_sims, block| {
+            let len = block_sims * self.num_rounds;
+            let offset = start * self.num_rounds;
+            for (p, rounds) in data.iter().enumerate() {
+                block[p * stride..p * stride + len].copy_from_slice(&rounds[offset..offset + len]);
             }
         });
-        self.update_player_stats_from_thread(&Arc::try_unwrap(thread_players).unwrap().into_inner().unwrap())
+        self.update_player_stats_from_thread(&field, scored);
+        Ok(())
+    }
+
+    /// Simulates and scores tournaments one block at a time, without keeping the rounds in `data`.
+    /// Each worker only holds the rounds of its current block, so memory scales with field size * block size.
+    fn stream_tournaments(&mut self) -> PyResult<()> {
+        self.check_cut()?;
+        let field = self.sorted_field();
+        self.stream_batch(&field, 0, self.num_sims);
+        Ok(())
     }
 
     fn calculate_results(&mut self) {
         self.normalize_results();
     }
 
-    fn run(&mut self) {
-        self.sim_rounds();
-        self.sim_tournaments();
-        self.calculate_results();
+    /// Runs a full simulation. Draws depend only on the seed and each player's id, so two runs with the same
+    /// seed share their random numbers (common random numbers) and differ only through the configuration.
+    /// The GIL is released while simulating, so other Python threads keep running.
+    #[pyo3(signature = (seed = None))]
+    fn run(&mut self, py: Python, seed: Option<u64>) -> PyResult<()> {
+        self.check_cut()?;
+        py.allow_threads(|| self.run_seeded(seed));
+        Ok(())
+    }
+
+    /// Streams tournaments in batches of `batch_size` until the standard error of every player's win, top N
+    /// and made cut estimate is at most `tolerance`, or `max_sims` tournaments have been run. Results are
+    /// calculated on return, `sims_used` and each player's `std_error` report what was reached. Returns
+    /// whether the tolerance was met. With the same seed, the results equal `run` with `num_sims = sims_used`.
+    #[pyo3(signature = (tolerance, max_sims, batch_size = 10000))]
+    fn run_until(&mut self, py: Python, tolerance: f64, max_sims: usize, batch_size: usize) -> PyResult<bool> {
+        self.check_cut()?;
+        Ok(py.allow_threads(|| self.run_batches(tolerance, max_sims, batch_size)))
+    }
+
+    /// Number of tournaments behind the current results
+    #[getter]
+    fn sims_used(&self) -> u64 {
+        self.tallies.values().map(|t| t.sims).max().unwrap_or(0)
+    }
+
+    fn reset_results(&mut self) {
+        self.tallies.clear();
+        self.matchups = None;
+        self.finish_ids.clear();
+        self.finishes.clear();
+        for player in self.players.values_mut() {
+            *player = Player::new(player.index, player.std_dev);
+        }
+    }
+
+    /// Tournaments simulated and seconds spent in each phase since the last call, which resets them.
+    /// `generate` and `score` are summed over worker threads, `draw` and `wall` are elapsed time.
+    fn take_timings(&mut self) -> HashMap<String, f64> {
+        let t = std::mem::take(&mut self.timings);
+        let seconds = |ns: u64| ns as f64 / 1e9;
+        HashMap::from([
+            ("tournaments".to_string(), t.tournaments as f64),
+            ("draw".to_string(), seconds(t.draw_ns)),
+            ("generate".to_string(), seconds(t.generate_ns)),
+            ("score".to_string(), seconds(t.score_ns)),
+            ("wall".to_string(), seconds(t.wall_ns)),
+        ])
     }
 
     fn get_players(&self) -> HashMap<u32, Player> {
         self.players.clone()
     }
 
+    /// Results as a dict of NumPy columns sorted by dg_id: `dg_id` plus one column per `Player` field.
+    /// Each array takes ownership of a Rust buffer, so no per-player Python objects are created.
+    fn results_array<'py>(&self, py: Python<'py>) -> PyResult<&'py PyDict> {
+        let mut field: Vec<(&u32, &Player)> = self.players.iter().collect();
+        field.sort_unstable_by_key(|(id, _)| **id);
+        let column = |stat: fn(&Player) -> f32| field.iter().map(|(_, p)| stat(p)).collect::<Vec<f32>>().into_pyarray(py);
+
+        let columns = PyDict::new(py);
+        columns.set_item("dg_id", field.iter().map(|(id, _)| **id).collect::<Vec<u32>>().into_pyarray(py))?;
+        columns.set_item("index", column(|p| p.index))?;
+        columns.set_item("std_dev", column(|p| p.std_dev))?;
+        columns.set_item("avg_finish", column(|p| p.avg_finish))?;
+        columns.set_item("avg_earnings", column(|p| p.avg_earnings))?;
+        columns.set_item("win", column(|p| p.win))?;
+        columns.set_item("top5", column(|p| p.top5))?;
+        columns.set_item("top10", column(|p| p.top10))?;
+        columns.set_item("top20", column(|p| p.top20))?;
+        columns.set_item("made_cut", column(|p| p.made_cut))?;
+        columns.set_item("std_error", column(|p| p.std_error))?;
+        Ok(columns)
+    }
+
+    /// Matchup counts from the last run, see `set_track_matchups` and `add_matchup_group`. Returns a dict with
+    /// `dg_ids`, `sims`, the k x k u32 arrays `ahead`, `ties` and `both_missed_cut` indexed in `dg_ids` order,
+    /// and `groups`, a list of dicts with `dg_ids`, `win_shares` (wins in sixths, dead heats split) and
+    /// `all_missed_cut`.
+    fn matchups<'py>(&self, py: Python<'py>) -> PyResult<&'py PyDict> {
+        let m = match &self.matchups {
+            Some(m) => m,
+            None => return Err(PyRuntimeError::new_err("No matchups recorded, call set_track_matchups or add_matchup_group before simulating")),
+        };
+        let k = m.ids.len();
+        let result = PyDict::new(py);
+        result.set_item("dg_ids", m.ids.clone().into_pyarray(py))?;
+        result.set_item("sims", m.sims)?;
+        result.set_item("ahead", m.ahead.clone().into_pyarray(py).reshape([k, k])?)?;
+        result.set_item("ties", m.ties.clone().into_pyarray(py).reshape([k, k])?)?;
+        result.set_item("both_missed_cut", m.both_missed_cut.clone().into_pyarray(py).reshape([k, k])?)?;
+
+        let mut groups = Vec::with_capacity(m.groups.len());
+        for group in m.groups.iter() {
+            let g = PyDict::new(py);
+            g.set_item("dg_ids", group.ids.clone())?;
+            g.set_item("win_shares", group.win_shares.clone())?;
+            g.set_item("all_missed_cut", group.all_missed_cut)?;
+            groups.push(g);
+        }
+        result.set_item("groups", groups)?;
+        Ok(result)
+    }
+
+    /// Finishing position counts from the last run with `set_track_positions(true)`. Returns the dg_ids and a
+    /// players x positions u32 array in the same order, column 0 counting wins. The array is a view of a
+    /// Rust-owned buffer.
+    fn position_histogram<'py>(&self, py: Python<'py>) -> PyResult<(&'py PyArray1<u32>, &'py PyArray2<u32>)> {
+        let mut field: Vec<(&u32, &Tally)> = self.tallies.iter().collect();
+        field.sort_unstable_by_key(|(id, _)| **id);
+        let num_positions = field.iter().map(|(_, t)| t.positions.len()).max().unwrap_or(0);
+        if num_positions == 0 {
+            return Err(PyRuntimeError::new_err("No finishing positions recorded, call set_track_positions(True) before simulating"));
+        }
+
+        let mut counts = Vec::with_capacity(field.len() * num_positions);
+        for (_, tally) in field.iter() {
+            counts.extend_from_slice(&tally.positions);
+            counts.resize(counts.len() + num_positions - tally.positions.len(), 0);
+        }
+        let dg_ids = field.iter().map(|(id, _)| **id).collect::<Vec<u32>>().into_pyarray(py);
+        let histogram = counts.into_pyarray(py).reshape([field.len(), num_positions])?;
+        Ok((dg_ids, histogram))
+    }
+
+    /// Finishing position of every player in every tournament, as a players x tournaments u16 array with rows
+    /// sorted by dg_id. Requires `set_record_finishes(True)` before simulating.
+    fn finishing_positions<'py>(&self, py: Python<'py>) -> PyResult<(&'py PyArray1<u32>, &'py PyArray2<u16>)> {
+        if self.finishes.is_empty() {
+            return Err(PyRuntimeError::new_err("No finishes recorded, call set_record_finishes(True) before simulating"));
+        }
+        let num_players = self.finish_ids.len();
+        let num_sims = self.finishes.iter().map(|b| b.first_sim + b.num_sims).max().unwrap_or(0);
+        let mut positions = vec![0u16; num_players * num_sims];
+        for block in self.finishes.iter() {
+            for p in 0..num_players {
+                let start = p * num_sims + block.first_sim;
+                positions[start..start + block.num_sims]
+                    .copy_from_slice(&block.positions[p * block.num_sims..(p + 1) * block.num_sims]);
+            }
+        }
+        let dg_ids = self.finish_ids.clone().into_pyarray(py);
+        let positions = positions.into_pyarray(py).reshape([num_players, num_sims])?;
+        Ok((dg_ids, positions))
+    }
+
     fn set_num_rounds(&mut self, num_rounds: usize) {
         self.num_rounds = num_rounds;
     }
@@ -271,14 +1042,104 @@ impl Sim {
         self.num_sims = num_sims;
     }
 
-    fn set_cut_round(&mut self, cut_round: usize) {
+    fn set_cut_round(&mut self, cut_round: usize) -> PyResult<()> {
+        if cut_round == 0 && self.made_cut_ids.is_some() {
+            return Err(PyValueError::new_err("A cut has been made, call set_made_cut(None) before removing the cut"));
+        }
         self.cut_round = cut_round;
+        Ok(())
     }
 
     fn set_cut_line(&mut self, cut_line: usize) {
         self.cut_line = cut_line;
     }
 
+    /// Also count how often each player finishes in every position, see `position_histogram`
+    fn set_track_positions(&mut self, track_positions: bool) {
+        self.track_positions = track_positions;
+    }
+
+    /// Keep every tournament's finishing positions for `finishing_positions`, 2 bytes per player and tournament
+    fn set_record_finishes(&mut self, record: bool) {
+        self.record_finishes = record;
+    }
+
+    /// Count head to head outcomes between every pair of `dg_ids`, or of the whole field when omitted.
+    /// Players must be added first. `set_track_matchups(False)` stops tracking pairs.
+    #[pyo3(signature = (track, dg_ids = None))]
+    fn set_track_matchups(&mut self, track: bool, dg_ids: Option<Vec<u32>>) -> PyResult<()> {
+        let mut ids = match (track, dg_ids) {
+            (false, _) => Vec::new(),
+            (true, Some(ids)) => ids,
+            (true, None) => self.players.keys().copied().collect(),
+        };
+        self.check_players(&ids)?;
+        ids.sort_unstable();
+        ids.dedup();
+        self.matchup_ids = ids;
+        Ok(())
+    }
+
+    /// Register a 2 or 3 ball whose winner is counted in every simulated tournament
+    fn add_matchup_group(&mut self, dg_ids: Vec<u32>) -> PyResult<()> {
+        self.check_players(&dg_ids)?;
+        let mut unique = dg_ids.clone();
+        unique.sort_unstable();
+        unique.dedup();
+        if unique.len() != dg_ids.len() || !(2..=3).contains(&dg_ids.len()) {
+            return Err(PyValueError::new_err(format!("Groups need 2 or 3 different players, got {:?}", dg_ids)));
+        }
+        self.matchup_groups.push(dg_ids);
+        Ok(())
+    }
+
+    fn clear_matchup_groups(&mut self) {
+        self.matchup_groups.clear();
+    }
+
+    /// Live mode: fix the strokes gained `id` has posted, `rounds` completed plus `current` through `thru` holes
+    /// of the next round. Only the remaining holes and rounds are simulated.
+    #[pyo3(signature = (id, rounds, current = 0.0, thru = 0))]
+    fn set_live_score(&mut self, id: u32, rounds: Vec<f32>, current: f32, thru: usize) -> PyResult<()> {
+        self.check_players(&[id])?;
+        if rounds.len() > self.num_rounds || thru >= HOLES_PER_ROUND || (rounds.len() == self.num_rounds && thru > 0) {
+            return Err(PyValueError::new_err(format!("Invalid live score for player {}: {} rounds, thru {}", id, rounds.len(), thru)));
+        }
+        self.live.insert(id, LiveScore { rounds, current, thru });
+        Ok(())
+    }
+
+    /// Live mode: apply a cut that has already been made, the given players made it and everyone else missed.
+    /// None simulates the cut again.
+    #[pyo3(signature = (dg_ids = None))]
+    fn set_made_cut(&mut self, dg_ids: Option<Vec<u32>>) -> PyResult<()> {
+        if let Some(ids) = &dg_ids {
+            if self.cut_round == 0 {
+                return Err(PyValueError::new_err("No cut in this tournament, cut_round is 0"));
+            }
+            self.check_players(ids)?;
+        }
+        self.made_cut_ids = dg_ids.map(|mut ids| {
+            ids.sort_unstable();
+            ids
+        });
+        Ok(())
+    }
+
+    fn clear_live(&mut self) {
+        self.live.clear();
+        self.made_cut_ids = None;
+    }
+
+    /// Worker threads used by each run, 0 (the default) for one per core
+    fn set_num_threads(&mut self, threads: usize) {
+        self.threads = threads;
+    }
+
+    fn set_block_size(&mut self, block_size: usize) {
+        self.block_size = round_to_rng_blocks(block_size);
+    }
+
     fn set_purse(&mut self, purse_dict: &PyDict) {
         for (pos, pay) in purse_dict.iter() {
             let pos = pos.extract().unwrap();
@@ -288,8 +1149,203 @@ impl Sim {
     }
 }
 
+/// Times `simulate_tournament` against `Ranker` on the same random tournaments for each field size.
+/// Returns (field size, reference ns per tournament, kernel ns per tournament) and fails if any
+/// finishing order differs.
+#[pyfunction]
+fn bench_ranking(field_sizes: Vec<usize>, num_tournaments: usize, num_rounds: usize, cut_round: usize,
+                 cut_line: usize, seed: u64) -> PyResult<Vec<(usize, f64, f64)>> {
+    let sim = Sim::new(num_tournaments, num_rounds, cut_round, cut_line, Some(seed));
+    let mut rng = StdRng::seed_from_u64(seed);
+    let normal = Normal::new(0.0, 3.0).unwrap();
+    let mut results = Vec::new();
+
+    for &num_players in field_sizes.iter() {
+        let tournaments: Vec<Vec<(u32, Vec<f32>)>> = (0..num_tournaments)
+            .map(|_| {
+                (0..num_players as u32)
+                    .map(|p| (p, (0..num_rounds).map(|_| normal.sample(&mut rng)).collect()))
+                    .collect()
+            })
+            .collect();
+
+        let start = Instant::now();
+        let reference: Vec<Vec<u32>> = tournaments
+            .iter()
+            .map(|t| sim.simulate_tournament(t).iter().map(|&(id, _)| id).collect())
+            .collect();
+        let reference_ns = start.elapsed().as_nanos() as f64 / num_tournaments as f64;
+
+        let start = Instant::now();
+        let mut scores = TournamentScores::new(num_players, num_rounds);
+        let mut ranker = Ranker::new(num_players);
+        let mut kernel: Vec<Vec<u32>> = Vec::with_capacity(num_tournaments);
+        for t in tournaments.iter() {
+            for (p, (_, rounds)) in t.iter().enumerate() {
+                scores.set_player(p, rounds);
+            }
+            kernel.push(ranker.rank(&scores, cut_round, cut_line).to_vec());
+        }
+        let kernel_ns = start.elapsed().as_nanos() as f64 / num_tournaments as f64;
+
+        if reference != kernel {
+            return Err(PyRuntimeError::new_err(format!("Finishing orders differ for a field of {}", num_players)));
+        }
+        results.push((num_players, reference_ns, kernel_ns));
+    }
+    Ok(results)
+}
+
 #[pymodule]
 fn sim(_py: Python, m: &PyModule) -> PyResult<()> {
     m.add_class::<Sim>()?;
+    m.add_function(wrap_pyfunction!(bench_ranking, m)?)?;
     Ok(())
-}
\ No newline at end of file
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    // Whole strokes, so that players often tie, at the cut line too
+    fn random_tournament(rng: &mut StdRng, num_players: usize, num_rounds: usize) -> Vec<(u32, Vec<f32>)> {
+        let normal: Normal<f32> = Normal::new(0.0, 3.0).unwrap();
+        (0..num_players as u32)
+            .map(|p| (p, (0..num_rounds).map(|_| normal.sample(&mut *rng).round()).collect()))
+            .collect()
+    }
+
+    fn test_sim(num_players: u32, num_sims: usize, seed: Option<u64>) -> Sim {
+        let mut sim = Sim::new(num_sims, 4, 2, 65, seed);
+        for p in 0..num_players {
+            sim.add_player(p * 7 + 1, (p % 13) as f32 * 0.25 - 1.5, 2.5 + (p % 5) as f32 * 0.1);
+        }
+        sim.purse = (1..=70).map(|pos| (pos, 10000 * (71 - pos))).collect();
+        sim.set_track_positions(true);
+        sim
+    }
+
+    #[test]
+    fn same_seed_same_tallies() {
+        // Not a multiple of the block size, so the last block is partial
+        let num_sims = 3000;
+        let mut reference = test_sim(156, num_sims, Some(9));
+        reference.set_num_threads(1);
+        reference.run_seeded(None);
+        assert_eq!(reference.sims_used(), num_sims as u64);
+
+        for &(threads, block_size) in &[(1, 256), (3, 1024), (8, 512), (0, 2048)] {
+            let mut sim = test_sim(156, num_sims, Some(9));
+            sim.set_num_threads(threads);
+            sim.set_block_size(block_size);
+            sim.run_seeded(None);
+            assert!(sim.tallies == reference.tallies, "{} threads, blocks of {}", threads, block_size);
+
+            // All rounds drawn up front, then scored
+            sim.reset_results();
+            sim.sim_rounds();
+            assert!(sim.sim_tournaments().is_ok());
+            assert!(sim.tallies == reference.tallies, "whole run, {} threads, blocks of {}", threads, block_size);
+        }
+
+        let mut sim = test_sim(156, num_sims, Some(1));
+        sim.run_seeded(Some(9));
+        assert!(sim.tallies == reference.tallies);
+    }
+
+    #[test]
+    fn random_seeds_differ() {
+        let mut first = test_sim(70, 1000, None);
+        let mut second = test_sim(70, 1000, None);
+        assert_ne!(first.seed, second.seed);
+        first.run_seeded(None);
+        second.run_seeded(None);
+        assert!(first.tallies != second.tallies);
+    }
+
+    #[test]
+    fn run_until_max_sims_equals_run() {
+        let num_sims = 3000;
+        let mut reference = test_sim(156, num_sims, Some(10));
+        reference.run_seeded(None);
+        for &batch_size in &[256, 1000, 5000] {
+            let mut sim = test_sim(156, 1, Some(10));
+            assert!(!sim.run_batches(1e-9, num_sims, batch_size));
+            assert_eq!(sim.sims_used(), num_sims as u64);
+            assert!(sim.tallies == reference.tallies, "batches of {}", batch_size);
+        }
+    }
+
+    #[test]
+    fn batches_are_whole_rng_blocks() {
+        assert_eq!(round_to_rng_blocks(0), RNG_BLOCK_SIZE);
+        assert_eq!(round_to_rng_blocks(1), RNG_BLOCK_SIZE);
+        assert_eq!(round_to_rng_blocks(RNG_BLOCK_SIZE), RNG_BLOCK_SIZE);
+        assert_eq!(round_to_rng_blocks(1000), 4 * RNG_BLOCK_SIZE);
+        // A tolerance met after one batch shows its size
+        let mut sim = test_sim(70, 1, Some(10));
+        assert!(sim.run_batches(1.0, 100000, 1000));
+        assert_eq!(sim.sims_used(), 4 * RNG_BLOCK_SIZE as u64);
+        sim.set_block_size(300);
+        assert_eq!(sim.block_size, 2 * RNG_BLOCK_SIZE);
+    }
+
+    #[test]
+    fn cut_checked_before_running() {
+        let mut sim = test_sim(70, 256, Some(14));
+        assert!(sim.set_made_cut(Some(vec![1, 8, 15])).is_ok());
+        assert!(sim.set_cut_round(0).is_err());
+        assert_eq!(sim.cut_round, 2);
+        assert!(sim.check_cut().is_ok());
+        sim.set_num_rounds(1);
+        assert!(sim.check_cut().is_err());
+        assert!(sim.stream_tournaments().is_err());
+        assert!(sim.tallies.is_empty());
+
+        sim.set_num_rounds(4);
+        assert!(sim.set_made_cut(None).is_ok());
+        assert!(sim.set_cut_round(0).is_ok());
+        assert!(sim.check_cut().is_ok());
+        assert!(sim.stream_tournaments().is_ok());
+        assert_eq!(sim.sims_used(), 256);
+    }
+
+    #[test]
+    fn ranker_matches_reference() {
+        let num_rounds = 4;
+        let mut rng = StdRng::seed_from_u64(8);
+        for &num_players in &[70, 156, 240] {
+            for &(cut_round, cut_line) in &[(2, 65), (3, 70), (2, 300), (0, 65)] {
+                let sim = Sim::new(1, num_rounds, cut_round, cut_line, Some(8));
+                let mut scores = TournamentScores::new(num_players, num_rounds);
+                let mut ranker = Ranker::new(num_players);
+                let mut ties_at_cut = 0;
+                for _ in 0..200 {
+                    let tournament = random_tournament(&mut rng, num_players, num_rounds);
+                    for (p, (_, rounds)) in tournament.iter().enumerate() {
+                        scores.set_player(p, rounds);
+                    }
+                    let reference: Vec<u32> = sim.simulate_tournament(&tournament).iter().map(|&(id, _)| id).collect();
+                    assert_eq!(ranker.rank(&scores, cut_round, cut_line), &reference[..]);
+
+                    if cut_round > 0 && cut_line < num_players {
+                        // The same cut, already made
+                        let mut made_cut = vec![false; num_players];
+                        for &p in &reference[..cut_line] {
+                            made_cut[p as usize] = true;
+                        }
+                        assert_eq!(ranker.rank_made_cut(&scores, cut_round, &made_cut), &reference[..]);
+
+                        let cut = scores.after_round(cut_round);
+                        if cut[reference[cut_line - 1] as usize] == cut[reference[cut_line] as usize] {
+                            ties_at_cut += 1;
+                        }
+                    }
+                }
+                if cut_round > 0 && cut_line < num_players {
+                    assert!(ties_at_cut > 0, "no tie at the cut line for a field of {}", num_players);
+                }
+            }
+        }
+    }
+}
@@ -0,0 +1,120 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+metaFilename = 'meta.json'
+positionsFilename = 'positions.npy'
+dgIdsFilename = 'dg_ids.npy'
+# Per player inputs, one .npy column each, e.g. players_index.npy
+playerColumnPrefix = 'players_'
+# Tournaments read at a time by SimRun.iter_chunks
+default_chunk_sims = 10000
+
+
+def run_name(sim_tournament_id, sim_date, seed):
+    return f'{sim_tournament_id}_{sim_date}_{seed}'
+
+
+def write_run(directory, dg_ids, positions, players=None, meta=None):
+    """
+    Saves a run to directory: dg_ids, the players x tournaments finishing positions from Sim.finishing_positions,
+    per player columns in players (e.g. index, std_dev, num_rounds, in dg_ids order) and a JSON dict meta
+    (seed, config, ...). The run is written next to directory and moved into place, so readers never see half of it.
+    """
+    positions = np.asarray(positions)
+    if positions.shape[0] != len(dg_ids):
+        raise ValueError(f'{positions.shape[0]} rows of positions for {len(dg_ids)} players')
+    tmp = f'{directory.rstrip(os.sep)}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, dgIdsFilename), np.asarray(dg_ids))
+    np.save(os.path.join(tmp, positionsFilename), positions)
+    for column, values in (players or {}).items():
+        np.save(os.path.join(tmp, f'{playerColumnPrefix}{column}.npy'), np.asarray(values))
+    meta = dict(meta or {})
+    meta['num_players'] = int(positions.shape[0])
+    meta['num_sims'] = int(positions.shape[1])
+    with open(os.path.join(tmp, metaFilename), 'w') as f:
+        json.dump(meta, f, indent=2, default=str)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+
+
+def list_runs(directory):
+    """Metadata of every run saved under directory, one row per run"""
+    rows = []
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name, metaFilename)
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    rows.append({'name': name, **json.load(f)})
+    return pd.DataFrame(rows)
+
+
+class SimRun:
+    """
+    A run saved by write_run. positions is memory mapped, so only the tournaments being read are paged in.
+    Results cover the field as simulated: positions count from 1st and the made cut rule is Sim's,
+    position <= cut_line + 1.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, metaFilename), 'r') as f:
+            self.meta = json.load(f)
+        self.dg_ids = np.load(os.path.join(directory, dgIdsFilename))
+        self.positions = np.load(os.path.join(directory, positionsFilename), mmap_mode='r')
+        self.players = {}
+        for filename in os.listdir(directory):
+            if filename.startswith(playerColumnPrefix):
+                self.players[filename[len(playerColumnPrefix):-len('.npy')]] = np.load(os.path.join(directory, filename))
+
+    @property
+    def num_players(self):
+        return self.positions.shape[0]
+
+    @property
+    def num_sims(self):
+        return self.positions.shape[1]
+
+    def iter_chunks(self, chunk_sims=default_chunk_sims):
+        """Players x tournaments blocks of at most chunk_sims tournaments, read from disk one at a time"""
+        for start in range(0, self.num_sims, chunk_sims):
+            yield np.asarray(self.positions[:, start:start + chunk_sims])
+
+    def position_histogram(self, chunk_sims=default_chunk_sims):
+        """Players x positions counts, as returned by Sim.position_histogram, for use with market_tools"""
+        num_positions = self.num_players
+        offsets = (np.arange(self.num_players) * num_positions)[:, None]
+        counts = np.zeros(self.num_players * num_positions, dtype=np.uint32)
+        for chunk in self.iter_chunks(chunk_sims):
+            counts += np.bincount((offsets + chunk.astype(np.int64) - 1).ravel(),
+                                  minlength=len(counts)).astype(np.uint32)
+        return self.dg_ids, counts.reshape(self.num_players, num_positions)
+
+    def earnings(self, purse, cut_line=None, chunk_sims=default_chunk_sims):
+        """Average earnings of each player under purse ({position: payout}), paid to players who made the cut"""
+        if cut_line is None:
+            cut_line = self.meta.get('cut_line', self.num_players)
+        payouts = np.zeros(self.num_players + 1)
+        for pos, pay in purse.items():
+            if 0 < int(pos) <= self.num_players and int(pos) <= cut_line + 1:
+                payouts[int(pos)] = pay
+        total = np.zeros(self.num_players)
+        for chunk in self.iter_chunks(chunk_sims):
+            total += payouts[chunk].sum(axis=1)
+        return pd.DataFrame({'dg_id': self.dg_ids, 'avg_earnings': total / max(self.num_sims, 1)})
+
+    def head_to_head(self, dg_id_a, dg_id_b, chunk_sims=default_chunk_sims):
+        """Share of tournaments player a finished ahead of b, and behind b"""
+        missing = np.setdiff1d([dg_id_a, dg_id_b], self.dg_ids)
+        if len(missing) > 0:
+            raise KeyError(f'Players {missing.tolist()} are not in this run')
+        a, b = np.searchsorted(self.dg_ids, [dg_id_a, dg_id_b])
+        ahead = 0
+        for chunk in self.iter_chunks(chunk_sims):
+            ahead += int(np.count_nonzero(chunk[a] < chunk[b]))
+        return ahead / self.num_sims, 1 - ahead / self.num_sims
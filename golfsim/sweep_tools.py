@@ -0,0 +1,103 @@
+import itertools
+from datetime import date
+import numpy as np
+import pandas as pd
+from . import utils
+
+# Grid columns read by run_sweep, any other column is passed to the decay function in grid order
+sim_params = ['max_round_age', 'min_rounds', 'cut_round', 'cut_line']
+
+
+def make_grid(**params):
+    """Every combination of the given parameter lists, one row per grid point"""
+    return pd.DataFrame(list(itertools.product(*params.values())), columns=list(params))
+
+
+class FieldHistory:
+    """Round history of a field, loaded once to estimate skills under many parameter settings"""
+
+    def __init__(self, db, dg_ids, max_round_age, today=None):
+        if today is None:
+            today = date.today()
+        self.dg_ids = np.asarray(dg_ids)
+        df = db.get_field_rounds(self.dg_ids, since=utils.get_earliest_int_date(today, max_round_age))
+        self.max_round_age = max_round_age
+        self.tsgs = df['sg_total'].values.astype('float64')
+        self.ages = utils.get_age_int_dates(df['date'].values, utils.date_to_int(today)).astype('float64')
+
+        # Position of each round's player in dg_ids
+        order = np.argsort(self.dg_ids, kind='stable')
+        pos = np.searchsorted(self.dg_ids, df['dg_id'].values, sorter=order)
+        self.groups = order[np.minimum(pos, len(self.dg_ids) - 1)]
+
+    def calc_skills(self, max_round_ages, decayFunc, *args):
+        """
+        calc_field_skill for many settings at once. max_round_ages and each of args hold one value per grid point,
+        decayFunc must broadcast them against a (grid points, rounds) array of ages, as utils.inverseAgeDecay does.
+        Returns (index, sd, num_rounds) arrays of shape (grid points, players).
+        """
+        max_round_ages = np.asarray(max_round_ages)
+        if np.any(max_round_ages > self.max_round_age):
+            raise ValueError(f'History was loaded for rounds up to {self.max_round_age} days old')
+        num_points = len(max_round_ages)
+        num_players = len(self.dg_ids)
+
+        # Flatten (grid point, player) to one bincount group, rounds too old for a grid point get no weight
+        in_window = self.ages[None, :] < max_round_ages[:, None]
+        groups = (np.arange(num_points)[:, None] * num_players + self.groups[None, :]).ravel()
+        weights = np.broadcast_to(self.ages, (num_points, len(self.ages))).copy()
+        decayFunc(weights, *[np.asarray(a, dtype='float64')[:, None] for a in args])
+        weights = np.where(in_window, weights, 0.0)
+        size = num_points * num_players
+
+        counts = np.bincount(groups, weights=in_window.ravel(), minlength=size).reshape(num_points, num_players)
+        weight_sums = np.bincount(groups, weights=weights.ravel(), minlength=size).reshape(num_points, num_players)
+        weighted = np.bincount(groups, weights=(weights * self.tsgs).ravel(), minlength=size)
+        sums = np.bincount(groups, weights=(in_window * self.tsgs).ravel(), minlength=size)
+
+        has_rounds = (counts > 0).ravel()
+        index = np.full(size, np.nan)
+        np.divide(weighted, weight_sums.ravel(), out=index, where=has_rounds)
+        mean = np.zeros(size)
+        np.divide(sums, counts.ravel(), out=mean, where=has_rounds)
+        sq_dev = np.bincount(groups, weights=(in_window * (self.tsgs - mean[groups].reshape(num_points, -1)) ** 2).ravel(),
+                             minlength=size)
+        sd = np.full(size, np.nan)
+        np.divide(sq_dev, counts.ravel(), out=sd, where=has_rounds)
+        np.sqrt(sd, out=sd)
+        return index.reshape(num_points, num_players), sd.reshape(num_points, num_players), counts.astype('int64')
+
+
+def run_sweep(s, history, df_players, grid, decayFunc, min_rounds=0, seed=None):
+    """
+    Runs Sim s once per grid point and returns one results table per grid row, each tagged with its parameters.
+    grid columns in sim_params override s and min_rounds, the others are decayFunc arguments in column order.
+    Every run uses the same seed, so all grid points share their random draws and differ only by parameters.
+    df_players provides final_pred and std_deviation for players with min_rounds or fewer rounds.
+    """
+    if seed is None:
+        seed = s.seed
+    decay_columns = [c for c in grid.columns if c not in sim_params]
+    max_round_ages = grid['max_round_age'].values if 'max_round_age' in grid else [history.max_round_age] * len(grid)
+    sg_index, sg_sd, num_rounds = history.calc_skills(max_round_ages, decayFunc, *[grid[c].values for c in decay_columns])
+
+    players = df_players.set_index('dg_id').loc[history.dg_ids]
+    results = []
+    for k, point in enumerate(grid.to_dict('records')):
+        enough_rounds = num_rounds[k] > point.get('min_rounds', min_rounds)
+        index = np.where(enough_rounds, sg_index[k], players['final_pred'].values)
+        sd = np.where(enough_rounds, sg_sd[k], players['std_deviation'].values)
+        for i, idx, std_dev in zip(history.dg_ids, index, sd):
+            s.add_player(int(i), float(idx), float(std_dev))
+        if 'cut_round' in point:
+            s.set_cut_round(int(point['cut_round']))
+        if 'cut_line' in point:
+            s.set_cut_line(int(point['cut_line']))
+        s.run(seed)
+
+        df = pd.DataFrame(s.results_array())
+        df['num_rounds'] = df['dg_id'].map(pd.Series(num_rounds[k], index=history.dg_ids))
+        for c in grid.columns:
+            df[c] = point[c]
+        results.append(df)
+    return results
@@ -0,0 +1,200 @@
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+# Tracing is off until enable() is called. While off, span returns a shared no-op and count returns at once.
+enabled = False
+
+_lock = threading.Lock()
+_local = threading.local()
+_origin = time.perf_counter()
+# Finished spans as (name, path, start, duration, thread id, args), times in seconds since _origin
+_spans = []
+_counters = {}
+# db_tools.ConnectionManagers whose connections are traced, see watch_connection
+_managers = weakref.WeakSet()
+
+# Counters divided by a seconds counter in summary, e.g. tournaments simulated per second
+rates = {
+    'sim.tournaments_per_second': ('sim.tournaments', 'sim.wall_seconds'),
+    'http.bytes_per_second': ('http.bytes', 'http.seconds')
+}
+
+
+class _Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        _stack().append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        stack = _stack()
+        path = '/'.join(stack)
+        stack.pop()
+        with _lock:
+            _spans.append((self.name, path, self.start - _origin, duration, threading.get_ident(), self.args))
+        return False
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _count_statement(statement):
+    count('sql.statements')
+
+
+def _set_trace_callbacks(callback):
+    # Connections are opened with check_same_thread=False, so those of every thread can be reached from this one
+    for manager in list(_managers):
+        for conn in list(manager._connections):
+            try:
+                conn.set_trace_callback(callback)
+            except sqlite3.ProgrammingError:
+                # Closed
+                pass
+
+
+def enable():
+    global enabled
+    enabled = True
+    _set_trace_callbacks(_count_statement)
+
+
+def disable():
+    global enabled
+    enabled = False
+    _set_trace_callbacks(None)
+
+
+def reset():
+    global _origin
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _origin = time.perf_counter()
+
+
+def span(name, **args):
+    """
+    Context manager timing a block as a span nested under the spans open on this thread, e.g.
+    with trace_tools.span('load skills', players=156): ...
+    """
+    if not enabled:
+        return _null_span
+    return _Span(name, args)
+
+
+def traced(name=None):
+    """Decorator timing every call of a function as a span, named after the function by default"""
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with _Span(label, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def watch_connection(manager, conn):
+    """
+    Counts the SQL statements run on conn, a new connection of a db_tools.ConnectionManager, while tracing is
+    enabled. manager is held by weak reference, enable and disable reach all of its connections on every thread.
+    An executemany counts one statement per row.
+    """
+    _managers.add(manager)
+    if enabled:
+        conn.set_trace_callback(_count_statement)
+
+
+def record_sim(s):
+    """Adds the timers of Sim s since its last take_timings to the sim.* counters"""
+    timings = s.take_timings()
+    if not enabled:
+        return
+    count('sim.tournaments', int(timings.pop('tournaments')))
+    for phase, seconds in timings.items():
+        count(f'sim.{phase}_seconds', seconds)
+
+
+def summary():
+    """Calls, total, min and max seconds of every span path, all counters and the rates they allow"""
+    with _lock:
+        spans = list(_spans)
+        counters = dict(_counters)
+    by_path = {}
+    for name, path, start, duration, tid, args in spans:
+        s = by_path.get(path)
+        if s is None:
+            by_path[path] = {'calls': 1, 'total': duration, 'min': duration, 'max': duration}
+        else:
+            s['calls'] += 1
+            s['total'] += duration
+            s['min'] = min(s['min'], duration)
+            s['max'] = max(s['max'], duration)
+    derived = {rate: counters[n] / counters[d] for rate, (n, d) in rates.items() if counters.get(d)}
+    return {'spans': dict(sorted(by_path.items())), 'counters': dict(sorted(counters.items())), 'rates': derived}
+
+
+def write_summary(filename):
+    with open(filename, 'w') as f:
+        json.dump(summary(), f, indent=2)
+
+
+def write_chrome_trace(filename):
+    """Spans as complete events and final counter values in the Trace Event Format, e.g. for chrome://tracing"""
+    pid = os.getpid()
+    with _lock:
+        spans = list(_spans)
+        counters = dict(_counters)
+    events = [{'name': name, 'cat': path.split('/')[0], 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6,
+               'pid': pid, 'tid': tid, 'args': args}
+              for name, path, start, duration, tid, args in spans]
+    end = max((e['ts'] + e['dur'] for e in events), default=0)
+    for name, value in counters.items():
+        events.append({'name': name, 'ph': 'C', 'ts': end, 'pid': pid, 'args': {'value': value}})
+    with open(filename, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def save(directory, name):
+    """Writes the summary to {name}_summary.json and the Chrome trace to {name}_trace.json in directory"""
+    os.makedirs(directory, exist_ok=True)
+    write_summary(os.path.join(directory, f'{name}_summary.json'))
+    write_chrome_trace(os.path.join(directory, f'{name}_trace.json'))
@@ -1,4 +1,5 @@
 import json
+import hashlib
 import requests
 import re
 from datetime import date, timedelta
@@ -87,6 +88,45 @@ def calcPlayerSkill(tsgs, dates, decayFunc, *args):
     return sum(tsgs), sd
 
 
+def calc_field_skill(dg_ids, round_dg_ids, tsgs, ages, decayFunc, *args):
+    """
+    Vectorized calcPlayerSkill for a whole field.
+    round_dg_ids, tsgs and ages describe one round per element, in any order.
+    Returns (index, sd, num_rounds) arrays aligned with dg_ids. Players without rounds get nan index/sd.
+    """
+    dg_ids = np.asarray(dg_ids)
+    round_dg_ids = np.asarray(round_dg_ids)
+    tsgs = np.asarray(tsgs, dtype='float64')
+    weights = np.array(ages, dtype='float64')
+    num_players = len(dg_ids)
+
+    # Map each round to the position of its player in dg_ids, dropping rounds of players not in the field
+    order = np.argsort(dg_ids, kind='stable')
+    pos = np.searchsorted(dg_ids, round_dg_ids, sorter=order)
+    groups = order[np.minimum(pos, num_players - 1)] if num_players > 0 else pos
+    valid = dg_ids[groups] == round_dg_ids if num_players > 0 else np.zeros(len(pos), dtype=bool)
+    groups = groups[valid]
+    tsgs = tsgs[valid]
+    weights = weights[valid]
+
+    decayFunc(weights, *args)
+    counts = np.bincount(groups, minlength=num_players)
+    weight_sums = np.bincount(groups, weights=weights, minlength=num_players)
+    weighted = np.bincount(groups, weights=tsgs * weights, minlength=num_players)
+    sums = np.bincount(groups, weights=tsgs, minlength=num_players)
+
+    has_rounds = counts > 0
+    index = np.full(num_players, np.nan)
+    np.divide(weighted, weight_sums, out=index, where=has_rounds)
+    mean = np.zeros(num_players)
+    np.divide(sums, counts, out=mean, where=has_rounds)
+    sq_dev = np.bincount(groups, weights=(tsgs - mean[groups]) ** 2, minlength=num_players)
+    sd = np.full(num_players, np.nan)
+    np.divide(sq_dev, counts, out=sd, where=has_rounds)
+    np.sqrt(sd, out=sd)
+    return index, sd, counts
+
+
 def getSubstringFromIdentifiers(string, startID, endID):
     try:
         startIdx = string.index(startID) + len(startID)
@@ -98,6 +138,10 @@ def getSubstringFromIdentifiers(string, startID, endID):
     return ''
 
 
+def hash_json(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
 def alphanum_key(string):
     """
     Return a list of strings and numbers from the input string.
@@ -124,6 +168,20 @@ def get_age_int_date(old_date, new_date):
     return (new_date - old_date).days
 
 
+def get_age_int_dates(old_dates, new_date):
+    """
+    Vectorized get_age_int_date for an array of YYYYMMDD ints.
+    """
+    return (int_dates_to_datetime64(new_date) - int_dates_to_datetime64(old_dates)).astype('int64')
+
+
+def int_dates_to_datetime64(dates):
+    dates = np.asarray(dates, dtype='int64')
+    years = (dates // 10000 - 1970).astype('datetime64[Y]')
+    months = (years.astype('datetime64[M]') + (dates // 100 % 100 - 1)).astype('datetime64[D]')
+    return months + (dates % 100 - 1)
+
+
 def date_to_int(d):
     return int(str(d).replace('-', ''))
 
@@ -151,3 +209,7 @@ class CustomError(Exception):
 
 class ResponseErrorHTTP(CustomError):
     pass
+
+
+class CacheMissError(CustomError):
+    pass
@@ -0,0 +1,60 @@
+import time
+import config
+import logging
+import numpy as np
+import pandas as pd
+from golfsim import db_tools, dg_tools, pga_tools, sim, cache_tools
+
+log = logging.getLogger(__name__)
+if config.debug:
+    level = logging.WARNING
+    filename = ''
+    if config.verbose:
+        level = logging.INFO
+    if config.to_file:
+        filename = config.log_filename
+    logging.basicConfig(filename=filename, level=level)
+
+db = db_tools.DB_Interface(config.db_filename, read_only=True)
+s = sim.Sim(config.live_num_sims, config.num_rounds, config.cut_round, config.cut_line, config.seed)
+cache = cache_tools.ResponseCache(cache_tools.DiskBackend(config.cache_dir), replay=config.offline)
+api = dg_tools.API(cache=cache)
+s.set_purse(pga_tools.load_purse(db, db.get_max_sim_tournament_id(), config.pga_purse_url, cache))
+
+log.info('Loading player skills...')
+t = time.perf_counter()
+df_players = db.get_dg_pred()
+sg_index, sg_sd, num_rounds = db.get_field_skill(df_players['dg_id'].values, config.max_round_age,
+                                                 config.decayFunction, config.decayExp, config.decayOffset, [1])
+enough_rounds = num_rounds > config.min_rounds
+sg_index = np.where(enough_rounds, sg_index, df_players['final_pred'].values)
+sg_sd = np.where(enough_rounds, sg_sd, df_players['std_deviation'].values)
+field = set()
+for i, index, sd in zip(df_players['dg_id'].values, sg_index, sg_sd):
+    s.add_player(int(i), float(index), float(sd))
+    field.add(int(i))
+log.info(f'Loading player skills complete. ({time.perf_counter() - t}s)')
+
+while True:
+    t = time.perf_counter()
+    scores, made_cut, withdrawn = dg_tools.get_live_scores(api, config.num_rounds, config.cut_round)
+    for dg_id in withdrawn:
+        if dg_id in field:
+            s.remove_player(dg_id)
+            field.discard(dg_id)
+            log.info(f'Removed {dg_id} from the field, withdrawn or disqualified')
+    s.clear_live()
+    for dg_id, (rounds, current, thru) in scores.items():
+        if dg_id in field:
+            s.set_live_score(dg_id, rounds, current, thru)
+    if made_cut is not None:
+        s.set_made_cut([dg_id for dg_id in made_cut if dg_id in field])
+    s.run()
+    log.info(f'Live update for {len(scores)} players complete ({time.perf_counter() - t}s)')
+
+    df = pd.DataFrame(s.results_array()).merge(db.get_player_names()[['dg_id', 'player_name']], on='dg_id')
+    print(df.sort_values(by='win', ascending=False)[['player_name', 'win', 'top5', 'top10', 'made_cut']].head(20))
+
+    if config.live_refresh is None:
+        break
+    time.sleep(config.live_refresh)
@@ -1,9 +1,11 @@
+import os
 import time
 import config
 import logging
 from datetime import date
+import numpy as np
 import pandas as pd
-from golfsim import db_tools, pga_tools, sim, utils
+from golfsim import db_tools, pga_tools, sim, utils, cache_tools, market_tools, trace_tools, store_tools
 
 log = logging.getLogger(__name__)
 if config.debug:
@@ -14,10 +16,17 @@ if config.debug:
     if config.to_file:
         filename = config.log_filename
     logging.basicConfig(filename=filename, level=level)
+if config.trace:
+    trace_tools.enable()
 
 db = db_tools.DB_Interface(config.db_filename)
-s = sim.Sim(config.num_sims, config.num_rounds, config.cut_round, config.cut_line)
-s.set_purse(pga_tools.get_purse_breakdown(config.pga_purse_url))
+s = sim.Sim(config.num_sims, config.num_rounds, config.cut_round, config.cut_line, config.seed)
+cache = cache_tools.ResponseCache(cache_tools.DiskBackend(config.cache_dir), replay=config.offline)
+tournament_id = db.get_max_sim_tournament_id()
+purse = pga_tools.load_purse(db, tournament_id, config.pga_purse_url, cache)
+s.set_purse(purse)
+s.set_track_positions(config.track_positions)
+s.set_record_finishes(config.store_runs)
 
 log.info('Loading player list...')
 t = time.perf_counter()
@@ -26,68 +35,94 @@ log.info(f'Loading player list complete. ({time.perf_counter() - t}s)')
 
 log.info('Loading player profiles...')
 t = time.perf_counter()
-for i in df_players['dg_id']:
-    df_rounds = db.get_player_rounds([i])
-    df_rounds = df_rounds[df_rounds['date'].astype('int64') >
-                          utils.get_earliest_int_date(date.today(), config.max_round_age)]
-    sg_index = df_players.loc[df_players['dg_id'] == i]['final_pred'].values[0]
-    sg_sd = df_players.loc[df_players['dg_id'] == i]['std_deviation'].values[0]
-    if len(df_rounds) > config.min_rounds:
-        df_rounds['date'] = [utils.get_age_int_date(d, utils.date_to_int(date.today())) for d in df_rounds['date'].values]
-        sg_index, sg_sd = utils.calcPlayerSkill(df_rounds['sg_total'].values,
-                                                                    df_rounds['date'].astype('float64').values,
-                                                                    config.decayFunction,
-                                                                    config.decayExp, config.decayOffset, [1])
-    else:
-        log.info(f'Insufficient number of rounds for {i}, {len(df_rounds)}')
-
-    s.add_player(i, sg_index, sg_sd)
+with trace_tools.span('load skills'):
+    sg_index, sg_sd, num_rounds = db.get_field_skill(df_players['dg_id'].values, config.max_round_age,
+                                                     config.decayFunction, config.decayExp, config.decayOffset, [1])
+enough_rounds = num_rounds > config.min_rounds
+sg_index = np.where(enough_rounds, sg_index, df_players['final_pred'].values)
+sg_sd = np.where(enough_rounds, sg_sd, df_players['std_deviation'].values)
+for i, n in zip(df_players['dg_id'].values[~enough_rounds], num_rounds[~enough_rounds]):
+    log.info(f'Insufficient number of rounds for {i}, {n}')
+
+for i, index, sd in zip(df_players['dg_id'].values, sg_index, sg_sd):
+    s.add_player(int(i), float(index), float(sd))
+s.set_track_matchups(config.track_matchups)
+for group in config.matchup_groups:
+    s.add_matchup_group(group)
 
 
 log.info(f'Loading player profiles complete. ({time.perf_counter() - t}s)')
 
-log.info(f'Simulating {config.num_sims * config.num_rounds * df_players.shape[0]} player rounds...')
-t = time.perf_counter()
-s.sim_rounds()
-log.info(f'Simulating {config.num_sims * config.num_rounds * df_players.shape[0]} player rounds complete. ({time.perf_counter() - t}s)')
+if config.sim_tolerance is None:
+    log.info(f'Simulating {config.num_sims} tournaments (seed {s.seed})...')
+    t = time.perf_counter()
+    with trace_tools.span('simulate', num_sims=config.num_sims):
+        s.stream_tournaments()
+    log.info(f'Simulating {config.num_sims} tournaments complete ({time.perf_counter() - t}s)')
 
-log.info(f'Simulating {config.num_sims} tournaments...')
-t = time.perf_counter()
-s.sim_tournaments()
-log.info(f'Simulating {config.num_sims} tournaments complete ({time.perf_counter() - t}s)')
+    log.info(f'Calculating results...')
+    t = time.perf_counter()
+    s.calculate_results()
+    log.info(f'Calculating results complete. ({time.perf_counter() - t}s)')
+else:
+    log.info(f'Simulating up to {config.num_sims} tournaments to a standard error of {config.sim_tolerance} (seed {s.seed})...')
+    t = time.perf_counter()
+    with trace_tools.span('simulate', num_sims=config.num_sims, tolerance=config.sim_tolerance):
+        converged = s.run_until(config.sim_tolerance, config.num_sims, config.sim_batch_size)
+    max_error = max(player.std_error for player in s.get_players().values())
+    if not converged:
+        log.warning(f'Standard error {max_error} above tolerance after {s.sims_used} tournaments')
+    log.info(f'Simulating {s.sims_used} tournaments complete, standard error {max_error} ({time.perf_counter() - t}s)')
 
-log.info(f'Calculating results...')
-t = time.perf_counter()
-s.calculate_results()
-log.info(f'Calculating results complete. ({time.perf_counter() - t}s)')
+trace_tools.record_sim(s)
 
-df = None
 df_names = db.get_player_names()
-tournament_id = db.get_max_sim_tournament_id()
-players = s.get_players()
-for player_id, player in players.items():
-    new = db.tournamentPlayerPredictions.get_df({
-                'sim_tournament_id': tournament_id,
-                'dg_id': player_id,
-                'x_earnings': player.avg_earnings,
-                'sim_win': player.win,
-                'sim_top5': player.top5,
-                'sim_top10': player.top10,
-                'sim_top20': player.top20,
-                'sim_made_cut': player.made_cut,
-                'x_finish': player.avg_finish,
-                'sg_index': player.index,
-                'sg_sd': player.std_dev,
-                'sim_date': utils.date_to_int(date.today())
-            })
-    if df is None:
-        df = new
-    else:
-        df = pd.concat((df, new))
+results = s.results_array()
+sim_columns = db_tools.TournamentPlayerPredictions.sim_columns
+df = pd.DataFrame({column: results[sim_column] for column, sim_column in sim_columns.items()})
+df['sim_tournament_id'] = tournament_id
+sim_date = utils.date_to_int(date.today())
+df['sim_date'] = sim_date
 
 df = df.sort_values(by='x_earnings', ascending=False)
 print(df.head())
 
+if config.store_runs:
+    dg_ids, positions = s.finishing_positions()
+    run_dir = os.path.join(config.runs_dir, store_tools.run_name(tournament_id, sim_date, s.seed))
+    inputs = pd.DataFrame({'index': sg_index, 'std_dev': sg_sd, 'num_rounds': num_rounds},
+                          index=df_players['dg_id'].values).loc[dg_ids]
+    store_tools.write_run(run_dir, dg_ids, positions, {c: inputs[c].values for c in inputs.columns}, {
+        'sim_tournament_id': tournament_id,
+        'sim_date': sim_date,
+        'seed': s.seed,
+        'num_rounds': config.num_rounds,
+        'cut_round': config.cut_round,
+        'cut_line': config.cut_line,
+        'max_round_age': config.max_round_age,
+        'decayFunction': config.decayFunction.__name__,
+        'decayExp': config.decayExp,
+        'decayOffset': config.decayOffset,
+        'min_rounds': config.min_rounds,
+        'purse': purse
+    })
+    log.info(f'Saved {positions.shape[1]} tournaments to {run_dir}')
+
+if config.track_positions:
+    dg_ids, histogram = s.position_histogram()
+    df_markets = market_tools.get_placement_markets(dg_ids, histogram)
+    print(df_markets.sort_values(by='top1', ascending=False).head())
+
+if config.track_matchups or config.matchup_groups:
+    matchups = s.matchups()
+    if config.track_matchups:
+        print(market_tools.get_two_ball_df(matchups).head())
+    if config.matchup_groups:
+        print(market_tools.get_group_df(matchups))
+
 save = input('Save results? y/n: ')
 if save == 'y':
-    db.update_player_predictions(df)
+    db.add_predictions(tournament_id, sim_date, results)
+
+if config.trace:
+    trace_tools.save(config.trace_dir, 'pre-tournament')
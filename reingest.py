@@ -0,0 +1,36 @@
+import argparse
+import time
+import config
+import logging
+from golfsim import db_tools, archive_tools
+
+log = logging.getLogger(__name__)
+if config.debug:
+    level = logging.WARNING
+    filename = ''
+    if config.verbose:
+        level = logging.INFO
+    if config.to_file:
+        filename = config.log_filename
+    logging.basicConfig(filename=filename, level=level)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild Round_History from the archived player profiles, offline')
+    parser.add_argument('--players', type=int, nargs='*', help='dg_ids to rebuild, default every archived player')
+    parser.add_argument('--until', type=int, help='use the last profile fetched on or before this date, YYYYMMDD')
+    parser.add_argument('--workers', type=int, default=config.reingestWorkers)
+    args = parser.parse_args()
+
+    db = db_tools.DB_Interface(config.db_filename)
+    archive = archive_tools.ProfileArchive(config.archive_dir)
+
+    log.info('Reingesting archived player profiles...')
+    t = time.perf_counter()
+    num_rounds = archive_tools.reingest(db, archive, args.players or None, args.until, args.workers)
+    log.info(f'Reingesting {len(num_rounds)} player profiles complete, {sum(num_rounds.values())} rounds '
+             f'({time.perf_counter() - t}s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import time
+import config
+import logging
+import numpy as np
+from golfsim import db_tools, pga_tools, sim, cache_tools, service_tools
+
+log = logging.getLogger(__name__)
+if config.debug:
+    level = logging.WARNING
+    filename = ''
+    if config.verbose:
+        level = logging.INFO
+    if config.to_file:
+        filename = config.log_filename
+    logging.basicConfig(filename=filename, level=level)
+
+db = db_tools.DB_Interface(config.db_filename)
+s = sim.Sim(config.service_num_sims, config.num_rounds, config.cut_round, config.cut_line, config.seed)
+cache = cache_tools.ResponseCache(cache_tools.DiskBackend(config.cache_dir), replay=config.offline)
+s.set_purse(pga_tools.load_purse(db, db.get_max_sim_tournament_id(), config.pga_purse_url, cache))
+s.set_track_positions(config.track_positions)
+
+log.info('Loading player skills...')
+t = time.perf_counter()
+df_players = db.get_dg_pred()
+sg_index, sg_sd, num_rounds = db.get_field_skill(df_players['dg_id'].values, config.max_round_age,
+                                                 config.decayFunction, config.decayExp, config.decayOffset, [1])
+enough_rounds = num_rounds > config.min_rounds
+sg_index = np.where(enough_rounds, sg_index, df_players['final_pred'].values)
+sg_sd = np.where(enough_rounds, sg_sd, df_players['std_deviation'].values)
+players = {int(i): (float(index), float(sd)) for i, index, sd in zip(df_players['dg_id'].values, sg_index, sg_sd)}
+names = {int(i): name for i, name in db.get_player_names()[['dg_id', 'player_name']].values}
+db.close()
+log.info(f'Loading player skills complete. ({time.perf_counter() - t}s)')
+
+service = service_tools.SimService(s, players, config.service_num_sims, config.cut_round, config.cut_line, names)
+log.info(f'Simulating {config.service_num_sims} tournaments (seed {s.seed})...')
+status = service.simulate()
+log.info(f'Simulating {config.service_num_sims} tournaments complete ({status["elapsed"]}s)')
+
+server = service_tools.make_server(service, config.service_host, config.service_port)
+log.info(f'Serving on http://{config.service_host}:{config.service_port}')
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    server.server_close()
@@ -0,0 +1,34 @@
+import time
+import config
+import logging
+import pandas as pd
+from golfsim import db_tools, pga_tools, sim, cache_tools, sweep_tools
+
+log = logging.getLogger(__name__)
+if config.debug:
+    level = logging.WARNING
+    filename = ''
+    if config.verbose:
+        level = logging.INFO
+    if config.to_file:
+        filename = config.log_filename
+    logging.basicConfig(filename=filename, level=level)
+
+db = db_tools.DB_Interface(config.db_filename)
+s = sim.Sim(config.sweep_num_sims, config.num_rounds, config.cut_round, config.cut_line, config.seed)
+cache = cache_tools.ResponseCache(cache_tools.DiskBackend(config.cache_dir), replay=config.offline)
+s.set_purse(pga_tools.load_purse(db, db.get_max_sim_tournament_id(), config.pga_purse_url, cache))
+
+grid = sweep_tools.make_grid(**config.sweep_grid)
+df_players = db.get_dg_pred()
+max_round_age = grid['max_round_age'].max() if 'max_round_age' in grid else config.max_round_age
+history = sweep_tools.FieldHistory(db, df_players['dg_id'].values, max_round_age)
+
+log.info(f'Sweeping {len(grid)} grid points (seed {s.seed})...')
+t = time.perf_counter()
+results = sweep_tools.run_sweep(s, history, df_players, grid, config.decayFunction, config.min_rounds)
+log.info(f'Sweeping {len(grid)} grid points complete ({time.perf_counter() - t}s)')
+
+df = pd.concat(results, ignore_index=True)
+df.to_csv(config.sweep_filename, index=False)
+print(df.groupby(list(grid.columns))[['win', 'avg_earnings']].describe())
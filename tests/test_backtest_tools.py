@@ -0,0 +1,53 @@
+import json
+import pandas as pd
+import pytest
+from golfsim import backtest_tools, db_tools
+
+params = {
+    'num_sims': 200,
+    'num_rounds': 4,
+    'max_round_age': 365,
+    'decayFunc': 'inverseAgeDecay',
+    'decayArgs': [1 / 1.01, 100],
+    'min_rounds': 0,
+    'seed': 16
+}
+start_date = 20240418
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = db_tools.DB_Interface(str(tmp_path / 'golfmodel.db'))
+    db.initialize_tables()
+    db.add_sim_tournament(db.simTournaments.get_df(['RBC Heritage', start_date, 'pga', 12, 2, 2, None]))
+    sim_tournament_id = db.get_max_sim_tournament_id()
+    # Players 1 to 3 played the week before, then finished the RBC Heritage in that order
+    rounds = []
+    for dg_id in (1, 2, 3):
+        rounds.append({'dg_id': dg_id, 'sg_total': 2.0 - dg_id, 'date': 20240411})
+        rounds.append({'dg_id': dg_id, 'sg_total': 0.0, 'date': start_date, 'fin_numeric': dg_id,
+                       'fin_text': str(dg_id), 'sim_tournament_id': sim_tournament_id})
+    db.add_player_rounds(pd.DataFrame(rounds))
+    yield db
+    db.close()
+
+
+def stored_skills(db):
+    df = db.get_skill_snapshots(20240417, params['max_round_age'], params['decayFunc'],
+                                json.dumps(params['decayArgs']))
+    return df['sg_index'].to_dict()
+
+
+def test_backtest_skills_follow_rounds(db):
+    events = backtest_tools.get_events(db)
+    predictions = backtest_tools.run_backtest(db.connections.filename, events, params, max_workers=1)
+    assert sorted(predictions['dg_id'].unique()) == [1, 2, 3]
+    # Snapshots are stored before the read-only workers start, only rounds before the event count
+    assert stored_skills(db) == {1: 1.0, 2: 0.0, 3: -1.0}
+
+    # New rounds drop the player's snapshots, the next backtest sees them
+    db.add_player_rounds(pd.DataFrame({'dg_id': [1], 'sg_total': [-5.0], 'date': [20240410]}))
+    assert stored_skills(db) == {2: 0.0, 3: -1.0}
+    backtest_tools.run_backtest(db.connections.filename, events, params, max_workers=1)
+    skills = stored_skills(db)
+    assert skills[1] < 1.0 and skills[2] == 0.0
@@ -0,0 +1,189 @@
+import sqlite3
+from datetime import date
+import pandas as pd
+import pytest
+from golfsim import db_tools
+
+# Schema written by the original create_db.py, before PRAGMA user_version was tracked
+baseline_schema = [
+    'CREATE TABLE Players (dg_id INTEGER PRIMARY KEY, player_name TEXT, amateur INTEGER, country TEXT, '
+    'country_code TE)',
+    'CREATE TABLE Sim_Tournaments (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, start_date INTEGER, tour TEXT, '
+    'dg_ekey INTEGER, cut_line INTEGER, cut_round INTEGER, purse TE)',
+    'CREATE TABLE Tournament_Player_Predictions (id INTEGER PRIMARY KEY AUTOINCREMENT, sim_tournament_id INTEGER, '
+    'dg_id INTEGER, x_earnings FLOAT, sim_win FLOAT, sim_top5 FLOAT, sim_top10 FLOAT, sim_top20 FLOAT, '
+    'sim_made_cut FLOAT, x_finish FLOAT, sg_index FLOAT, sg_sd FLOAT, sim_date INTEGER, '
+    'FOREIGN KEY(dg_id) REFERENCES Players(dg_id), FOREIGN KEY(sim_tournament_id) REFERENCES SimTournaments(id))',
+    'CREATE TABLE Courses (id INTEGER PRIMARY KEY AUTOINCREMENT, name TE)',
+    'CREATE TABLE Round_History (id INTEGER PRIMARY KEY AUTOINCREMENT, dg_id INTEGER, sg_total FLOAT, sg_putt FLOAT, '
+    'sg_arg FLOAT, sg_app FLOAT, sg_ott FLOAT, score INTEGER, round_num INTEGER, fin_numeric INTEGER, fin_text TEXT, '
+    'tour TEXT, course_id INTEGER, date INTEGER, sim_tournament_id INTEGER, '
+    'FOREIGN KEY(dg_id) REFERENCES Players(dg_id), FOREIGN KEY(course_id) REFERENCES Courses(id), '
+    'FOREIGN KEY(sim_tournament_id) REFERENCES Sim_Tournaments(id))',
+    'CREATE TABLE Current_DG_Pred (dg_id INTEGER PRIMARY KEY, age INTEGER, age_adjustment FLOAT, am INTEGER, '
+    'baseline_pred FLOAT, cf_approach_comp FLOAT, cf_short_comp FLOAT, country TEXT, country_adjustment FLOAT, '
+    'course_experience_adjustment FLOAT, course_history_adjustment FLOAT, driving_accuracy_adjustment FLOAT, '
+    'driving_distance_adjustment FLOAT, final_pred FLOAT, other_fit_adjustment FLOAT, player_name TEXT, '
+    'sample_size INTEGER, std_deviation FLOAT, strokes_gained_category_adjustment FLOAT, timing_adjustment FLOAT, '
+    'total_course_history_adjustment FLOAT, total_fit_adjustment FLOAT, true_sg_adjustments FLOAT, '
+    'FOREIGN KEY(dg_id) REFERENCES Players(dg_id))'
+]
+
+
+def schema_objects(conn, object_type):
+    cursor = conn.execute('SELECT name FROM sqlite_master WHERE type = ? AND name NOT LIKE ?',
+                          (object_type, 'sqlite_%'))
+    return {name for name, in cursor.fetchall()}
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    filename = str(tmp_path / 'baseline.db')
+    conn = sqlite3.connect(filename)
+    for statement in baseline_schema:
+        conn.execute(statement)
+    conn.execute("INSERT INTO Courses (id, name) VALUES (1, 'Harbour Town'), (2, 'Harbour Town'), (3, 'Augusta')")
+    conn.execute('INSERT INTO Round_History (dg_id, date, course_id, sg_total) VALUES (10, 20240418, 2, 1.5)')
+    conn.execute("INSERT INTO Sim_Tournaments (id, name, start_date, dg_ekey, purse) "
+                 "VALUES (1, 'RBC Heritage', 20240418, 12, '{1: 3600000, 2: 2160000}')")
+    conn.commit()
+    conn.close()
+    return filename
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = db_tools.DB_Interface(str(tmp_path / 'golfmodel.db'))
+    db.initialize_tables()
+    yield db
+    db.close()
+
+
+def test_migrate_baseline(baseline_db):
+    db = db_tools.DB_Interface(baseline_db)
+    assert db.get_schema_version() == len(db_tools.migrations)
+    for table in db.tables:
+        assert table.exists(db.conn), table.table_name
+    assert db.get_course_ids() == {'Harbour Town': 1, 'Augusta': 3}
+    assert db.get_field_rounds([10], columns=['course_id'])['course_id'].tolist() == [1]
+    assert db.get_purse(1) == {1: 3600000, 2: 2160000}
+    db.close()
+
+
+def test_migrated_indexes_match_new_database(baseline_db, db):
+    migrated = db_tools.DB_Interface(baseline_db)
+    assert schema_objects(migrated.conn, 'index') == schema_objects(db.conn, 'index')
+    assert schema_objects(migrated.conn, 'table') == schema_objects(db.conn, 'table')
+    for table in db.tables:
+        query = f'PRAGMA table_info({table.table_name})'
+        columns = [row[1] for row in db.conn.execute(query)]
+        assert [row[1] for row in migrated.conn.execute(query)] == columns, table.table_name
+    migrated.close()
+
+
+def test_migrate_is_idempotent(baseline_db):
+    db_tools.DB_Interface(baseline_db).close()
+    db = db_tools.DB_Interface(baseline_db)
+    assert db.get_schema_version() == len(db_tools.migrations)
+    db.close()
+
+
+# Hot lookups, as run by DB_Interface, each of which must be served by an index
+hot_queries = {
+    'get_player_rounds': (f'SELECT date FROM {db_tools.RoundHistory.table_name} WHERE dg_id in (1, 2)', ()),
+    'get_field_rounds': (f'SELECT dg_id, date, sg_total FROM {db_tools.RoundHistory.table_name} '
+                         f'WHERE 1 AND dg_id in (1, 2) AND date > ? AND date < ?', (20230101, 20240101)),
+    'ingest_player_profiles': (f'SELECT dg_id, date FROM {db_tools.RoundHistory.table_name} WHERE dg_id in (1, 2)',
+                               ()),
+    'get_course_id': (f'SELECT id FROM {db_tools.Courses.table_name} WHERE name = ?', ('',)),
+    'get_sim_tournament_id': (f'SELECT id FROM {db_tools.SimTournaments.table_name} '
+                              f'WHERE dg_ekey = ? AND start_date > ? AND start_date < ?', (1, 20240000, 20250000)),
+    'get_tournament_player_pred': (f'SELECT * FROM {db_tools.TournamentPlayerPredictions.table_name} '
+                                   f'WHERE sim_tournament_id = ? AND sim_date = ?', (1, 20240101)),
+    'get_player_pred_history': (f'SELECT * FROM {db_tools.TournamentPlayerPredictions.table_name} WHERE dg_id = ?',
+                                (1,)),
+    'get_latest_player_pred': (f'SELECT sim_tournament_id, MAX(sim_date) FROM '
+                               f'{db_tools.TournamentPlayerPredictions.table_name} GROUP BY sim_tournament_id', ()),
+    'get_skill_snapshots': (f'SELECT dg_id, sg_index, sg_sd, num_rounds FROM '
+                            f'{db_tools.PlayerSkillSnapshots.table_name} '
+                            f'WHERE as_of_date = ? AND decay_func = ? AND decay_args = ? AND max_round_age = ?',
+                            (20240101, '', '[]', 730)),
+    'invalidate_skill_snapshots': (f'DELETE FROM {db_tools.PlayerSkillSnapshots.table_name} WHERE dg_id in (1, 2)',
+                                   ()),
+    'get_profile_hashes': (f'SELECT dg_id, profile_hash FROM {db_tools.PlayerSyncState.table_name} '
+                           f'WHERE dg_id in (1, 2)', ()),
+    'get_player_tours': (f'SELECT DISTINCT dg_id, tour FROM {db_tools.RoundHistory.table_name} '
+                         f'WHERE dg_id in (1, 2) AND date > ?', (20230101,)),
+    'get_purse': (f'SELECT position, payout FROM {db_tools.Purses.table_name} WHERE sim_tournament_id = ?', (1,))
+}
+
+
+@pytest.mark.parametrize('name', hot_queries)
+def test_query_uses_index(db, name):
+    query, params = hot_queries[name]
+    plan = db.explain_query_plan(query, params)
+    assert any('USING' in step for step in plan), plan
+    assert not any(step.startswith('SCAN') and 'INDEX' not in step for step in plan), plan
+
+
+@pytest.mark.parametrize('name', hot_queries)
+def test_migrated_query_uses_index(baseline_db, name):
+    db = db_tools.DB_Interface(baseline_db)
+    query, params = hot_queries[name]
+    plan = db.explain_query_plan(query, params)
+    db.close()
+    assert any('USING' in step for step in plan), plan
+
+
+def add_rounds(db, rounds):
+    """rounds: (dg_id, tour, date)"""
+    with db.write() as conn:
+        conn.executemany(f'INSERT INTO {db_tools.RoundHistory.table_name} (dg_id, tour, date) VALUES (?, ?, ?)', rounds)
+
+
+def test_plan_player_updates(db):
+    # 1 and 2 play the PGA Tour, 3 the DP World Tour. The RBC Heritage had rounds on 18-21 April 2024.
+    add_rounds(db, [(1, 'pga', 20240411), (2, 'pga', 20240411), (3, 'euro', 20240407)])
+    schedule = [{'start_date': '2024-04-18', 'tour': 'pga'}, {'start_date': '2024-04-25', 'tour': 'pga'}]
+    db.set_sync_states([(1, 20240422, 'a'), (2, 20240421, 'b'), (3, 20240415, 'c')])
+    stale = db.plan_player_updates([1, 2, 3, 4], schedule, today=date(2024, 4, 24))
+    # 1 was synced after the final round, 2 on the day of it, 3 plays another tour and 4 was never synced
+    assert stale == [2, 4]
+    # Events of a tour no stored round has count for everyone
+    schedule.append({'start_date': '2024-04-18', 'tour': 'kft'})
+    assert db.plan_player_updates([1, 2, 3], schedule, today=date(2024, 4, 24)) == [2, 3]
+    assert db.plan_player_updates([1, 3], schedule[:2], today=date(2024, 4, 24), max_sync_age=5) == [3]
+    assert db.plan_player_updates([1, 3], schedule, today=date(2024, 4, 24), full=True) == [1, 3]
+
+
+def row_counts(db):
+    return {table.table_name: db.conn.execute(f'SELECT COUNT(*) FROM {table.table_name}').fetchone()[0]
+            for table in db.tables}
+
+
+def test_dataframe_writes_roll_back(db):
+    with db.write():
+        db.currentDGPred.append_df(pd.DataFrame({'dg_id': [1], 'final_pred': [1.5]}), db.conn)
+    before = row_counts(db)
+    with pytest.raises(RuntimeError):
+        with db.write():
+            db.add_player_rounds(pd.DataFrame({'dg_id': [1, 2], 'date': [20240418, 20240418],
+                                               'sg_total': [1.5, float('nan')]}))
+            db.add_sim_tournament(db.simTournaments.get_df(['RBC Heritage', 20240418, 'pga', 12, 65, 2, None]))
+            db.add_courses(pd.DataFrame({'name': ['Harbour Town']}))
+            db.players.append_df(pd.DataFrame({'dg_id': [1], 'player_name': ['Scottie Scheffler']}), db.conn)
+            db.currentDGPred.replace_df(pd.DataFrame({'dg_id': [2, 3], 'final_pred': [0.5, 0.2]}), db.conn)
+            assert db.get_field_rounds([1, 2], columns=['sg_total'])['sg_total'].isna().tolist() == [False, True]
+            raise RuntimeError
+    assert row_counts(db) == before
+    assert db.get_dg_pred()[['dg_id', 'final_pred']].values.tolist() == [[1, 1.5]]
+
+
+def test_rounds_without_course(db):
+    rounds = [{'date': 'Apr 18, 2024', 'course_name': 'Harbour Town'}, {'date': 'Apr 11, 2024', 'course_name': None},
+              {'date': 'Apr 4, 2024', 'course_name': ''}, {'date': 'Mar 28, 2024'}]
+    db.ingest_player_profiles([(1, {'dg_id': 1, 'data': rounds}), (2, {'dg_id': 2, 'data': rounds})])
+    assert db.get_courses()['name'].tolist() == ['Harbour Town']
+    course_ids = db.get_field_rounds([1, 2], columns=['date', 'course_id']).set_index('date')['course_id']
+    assert course_ids.isna().sum() == 6
+    assert course_ids[20240418].tolist() == [db.get_course_ids()['Harbour Town']] * 2
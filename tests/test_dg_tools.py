@@ -0,0 +1,44 @@
+from golfsim import dg_tools
+
+
+class LiveStatsAPI:
+    def __init__(self, rounds):
+        self.rounds = rounds
+
+    def get_live_stats(self, round=None, stats='sg_total'):
+        return {'live_stats': self.rounds.get(round, [])}
+
+
+round_1 = [
+    {'dg_id': 1, 'thru': 'F', 'sg_total': 1.5, 'position': 'T1'},
+    {'dg_id': 2, 'thru': 5, 'sg_total': -2.0, 'position': 'WD'},
+    {'dg_id': 3, 'thru': 'F', 'sg_total': -0.5, 'position': 'T3'}
+]
+round_2 = [
+    {'dg_id': 1, 'thru': 'F', 'sg_total': 0.5, 'position': '1'},
+    {'dg_id': 3, 'thru': 'F', 'sg_total': 0.0, 'position': '2'}
+]
+round_3 = [
+    {'dg_id': 1, 'thru': 4, 'sg_total': 0.2, 'position': '1'}
+]
+
+
+def test_withdrawal_is_not_the_cut():
+    scores, made_cut, withdrawn = dg_tools.get_live_scores(LiveStatsAPI({1: round_1, 2: round_2}), 4, 2)
+    assert made_cut is None
+    assert withdrawn == [2]
+    assert scores[1] == ([1.5, 0.5], 0.0, 0)
+    assert scores[2] == ([], -2.0, 5)
+
+
+def test_cut_after_cut_round():
+    scores, made_cut, withdrawn = dg_tools.get_live_scores(LiveStatsAPI({1: round_1, 2: round_2, 3: round_3}), 4, 2)
+    assert made_cut == [1, 3]
+    assert scores[1] == ([1.5, 0.5], 0.2, 4)
+
+
+def test_cut_from_positions():
+    missed = [dict(p, position='CUT') if p['dg_id'] == 3 else p for p in round_2]
+    _, made_cut, withdrawn = dg_tools.get_live_scores(LiveStatsAPI({1: round_1, 2: missed}), 4)
+    assert made_cut == [1]
+    assert withdrawn == [2]
@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pytest
+from golfsim import cache_tools, dg_tools, fetch_tools, utils
+
+
+class ProfileServer(ThreadingHTTPServer):
+    """
+    Serves canned player-profiles pages. failures maps a dg_id to the status codes answered, in order, before its
+    profile is served. Every request is recorded as (dg_id, time).
+    """
+
+    def __init__(self, failures=None):
+        super().__init__(('127.0.0.1', 0), ProfileHandler)
+        self.failures = {dg_id: list(codes) for dg_id, codes in (failures or {}).items()}
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/'
+
+    def attempts(self, dg_id):
+        return [t for i, t in self.requests if i == dg_id]
+
+
+class ProfileHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        dg_id = int(parse_qs(urlparse(self.path).query)['dg_id'][0])
+        with self.server.lock:
+            self.server.requests.append((dg_id, time.monotonic()))
+            codes = self.server.failures.get(dg_id)
+            code = codes.pop(0) if codes else 200
+        profile = {'dg_id': dg_id, 'data': [{'date': 'Apr 18, 2024', 'total': 1.5}]}
+        body = f"<script>reload_data = JSON.parse('{json.dumps(profile)}');\n</script>" if code == 200 else 'Error'
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(failures=None, cache=None):
+        server = ProfileServer(failures)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, dg_tools.API(site_url=server.url, cache=cache)
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_retry_and_backoff(serve):
+    server, api = serve({2: [500], 3: [429, 503], 4: [503, 503, 503, 503]})
+    fetcher = fetch_tools.ProfileFetcher(api, rate=1000, burst=10, max_workers=4, max_retries=2, backoff=0.05)
+    results = {dg_id: (profile, error) for dg_id, profile, error in fetcher.fetch([1, 2, 3, 4])}
+
+    for dg_id in (1, 2, 3):
+        profile, error = results[dg_id]
+        assert error is None
+        assert profile['dg_id'] == dg_id
+    assert isinstance(results[4][1], utils.ResponseErrorHTTP)
+    assert [len(server.attempts(dg_id)) for dg_id in (1, 2, 3, 4)] == [1, 2, 3, 3]
+    # Waits of backoff, then twice backoff
+    first, second, third = server.attempts(3)
+    assert second - first >= 0.05
+    assert third - second >= 0.1
+
+
+def test_rate_limit(serve):
+    rate = 20
+    burst = 2
+    server, api = serve()
+    fetcher = fetch_tools.ProfileFetcher(api, rate=rate, burst=burst, max_workers=4)
+    start = time.monotonic()
+    results = list(fetcher.fetch(range(1, 13)))
+    elapsed = time.monotonic() - start
+
+    assert all(error is None for _, _, error in results)
+    assert elapsed >= (12 - burst) / rate
+    # A request reaches the server after its token is taken: at most burst at once, then rate per second
+    for i, t in enumerate(sorted(t for _, t in server.requests)):
+        assert t - start >= (i + 1 - burst) / rate
+
+
+def test_cached_profiles_take_no_token(serve):
+    server, api = serve(cache=cache_tools.ResponseCache())
+    list(fetch_tools.ProfileFetcher(api, rate=1000, burst=10).fetch(range(1, 11)))
+    # Only one token a second, but every profile is cached
+    fetcher = fetch_tools.ProfileFetcher(api, rate=1, burst=1)
+    start = time.monotonic()
+    results = list(fetcher.fetch(range(1, 11)))
+    assert time.monotonic() - start < 0.5
+    assert all(error is None for _, _, error in results)
+    assert len(server.requests) == 10
+
+
+def test_close_cancels_pending(serve):
+    server, api = serve()
+    fetcher = fetch_tools.ProfileFetcher(api, rate=5, burst=1, max_workers=2)
+    start = time.monotonic()
+    results = fetcher.fetch(range(1, 21))
+    next(results)
+    results.close()
+    # Waits for the profile still being fetched, not for the 19 others at 5 a second
+    assert time.monotonic() - start < 1
+    assert len(server.requests) <= 3
+
+
+def test_token_bucket_burst():
+    bucket = fetch_tools.TokenBucket(rate=10, burst=3)
+    t = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - t < 0.05
+    bucket.acquire()
+    assert time.monotonic() - t >= 0.09
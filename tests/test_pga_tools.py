@@ -0,0 +1,58 @@
+import pytest
+from golfsim import db_tools, pga_tools
+
+standard_table = '''<p>Purse breakdown</p><table>
+<tr><th>Position</th><th>Share</th><th>Payout</th></tr>
+<tr><td>1</td><td>18</td><td>$3,600,000</td></tr>
+<tr><td>2</td><td>10.9</td><td>$2,180,000</td></tr>
+<tr><td>T3</td><td>6.9</td><td>$1,380,000.00</td></tr>
+</table><table><tr><td>1</td><td>$1</td></tr></table>'''
+
+masters_table = '''<table>
+<tr><td>1st</td><td>$3,600,000</td><td>26th</td><td>$136,000</td></tr>
+<tr><td>2nd</td><td>$2,160,000</td><td>27th</td><td>$126,000</td></tr>
+</table>'''
+
+
+def test_integer_share_column():
+    assert pga_tools.parse_purse_table(standard_table) == {1: 3600000, 2: 2180000, 3: 1380000}
+
+
+def test_masters_layout():
+    assert pga_tools.parse_purse_table(masters_table) == {1: 3600000, 26: 136000, 2: 2160000, 27: 126000}
+
+
+def test_missing_closing_tag():
+    truncated = standard_table[:standard_table.index('</table>')]
+    assert pga_tools.parse_purse_table(truncated) == {1: 3600000, 2: 2180000, 3: 1380000}
+
+
+def test_no_table():
+    assert pga_tools.parse_purse_table('<p>Coming soon</p>') == {}
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = db_tools.DB_Interface(str(tmp_path / 'golfmodel.db'))
+    db.initialize_tables()
+    yield db
+    db.close()
+
+
+def test_load_purse_by_url(db, monkeypatch):
+    pages = {'rbc': {1: 3600000}, 'zurich': {1: 1200000}}
+    monkeypatch.setattr(pga_tools, 'get_purse_breakdown', lambda url, cache=None: pages[url])
+    assert pga_tools.load_purse(db, 1, 'rbc') == {1: 3600000}
+    assert db.get_purse(1, 'rbc') == {1: 3600000}
+    # A purse from another page is used but does not replace the stored one
+    assert pga_tools.load_purse(db, 1, 'zurich') == {1: 1200000}
+    assert db.get_purse(1) == {1: 3600000}
+    pages['rbc'] = {}
+    assert pga_tools.load_purse(db, 1, 'rbc') == {1: 3600000}
+
+
+def test_load_purse_without_tournament(db, monkeypatch):
+    monkeypatch.setattr(pga_tools, 'get_purse_breakdown', lambda url, cache=None: {1: 3600000})
+    assert db.get_purse(None) is None
+    assert pga_tools.load_purse(db, None, 'rbc') == {1: 3600000}
+    assert db.conn.execute(f'SELECT COUNT(*) FROM {db_tools.Purses.table_name}').fetchone()[0] == 0
@@ -0,0 +1,107 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+import numpy as np
+import pytest
+from golfsim import service_tools
+
+
+class BorrowedSim:
+    """Stands in for Sim, failing like a pyo3 class any time it is used while run holds it"""
+
+    def __init__(self, run_seconds=0.3):
+        self.run_seconds = run_seconds
+        self.running = False
+        self.players = {}
+        self._seed = 7
+
+    def _check(self):
+        if self.running:
+            raise RuntimeError('Already mutably borrowed')
+
+    @property
+    def seed(self):
+        self._check()
+        return self._seed
+
+    def add_player(self, dg_id, index, std_dev):
+        self._check()
+        self.players[dg_id] = (index, std_dev)
+
+    def remove_player(self, dg_id):
+        self._check()
+        return self.players.pop(dg_id, None) is not None
+
+    def set_num_sims(self, num_sims):
+        self._check()
+
+    def set_cut_round(self, cut_round):
+        self._check()
+
+    def set_cut_line(self, cut_line):
+        self._check()
+
+    def run(self, seed=None):
+        self._check()
+        self.running = True
+        time.sleep(self.run_seconds)
+        self.running = False
+        if seed is not None:
+            self._seed = seed
+
+    def results_array(self):
+        self._check()
+        ids = sorted(self.players)
+        return {'dg_id': np.array(ids, dtype=np.uint32), 'win': np.full(len(ids), 1 / len(ids), dtype=np.float32)}
+
+
+@pytest.fixture
+def server():
+    service = service_tools.SimService(BorrowedSim(), {i: (1.0, 2.8) for i in range(1, 157)}, 1000, 2, 65,
+                                       {1: 'Scottie Scheffler'})
+    server = service_tools.make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://{service_tools.default_host}:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def get(url):
+    return json.loads(urllib.request.urlopen(url).read())
+
+
+def post(url, data):
+    request = urllib.request.Request(url, json.dumps(data).encode(), {'Content-Type': 'application/json'})
+    try:
+        return 200, json.loads(urllib.request.urlopen(request).read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_reads_during_simulation(server):
+    simulate = threading.Thread(target=post, args=(server + '/simulate', {'seed': 11}))
+    simulate.start()
+    time.sleep(0.05)
+    statuses = []
+    while simulate.is_alive():
+        statuses.append(get(server + '/status'))
+        assert len(get(server + '/players')) == 156
+        get(server + '/results')
+    simulate.join()
+    assert len(statuses) > 0
+    assert get(server + '/status')['seed'] == 11
+    results = get(server + '/results')
+    assert results['version'] == 1
+    assert results['players']['player_name'][0] == 'Scottie Scheffler'
+
+
+def test_adjust_field(server):
+    assert post(server + '/player', {'dg_id': 1, 'withdraw': True})[1]['num_players'] == 155
+    assert post(server + '/player', {'dg_id': 999})[0] == 404
+    assert post(server + '/player', {'dg_id': 2, 'bogus': 1})[0] == 400
+    status = post(server + '/cut', {'cut_line': 50})[1]
+    assert status['cut_line'] == 50 and status['stale']
+    assert '1' not in get(server + '/players')
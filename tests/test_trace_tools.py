@@ -0,0 +1,49 @@
+import threading
+import pytest
+from golfsim import db_tools, trace_tools
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = db_tools.DB_Interface(str(tmp_path / 'golfmodel.db'))
+    db.initialize_tables()
+    yield db
+    trace_tools.disable()
+    trace_tools.reset()
+    db.close()
+
+
+def statements():
+    return trace_tools.summary()['counters'].get('sql.statements', 0)
+
+
+def test_counts_statements_on_every_thread(db):
+    opened = threading.Event()
+    traced = threading.Event()
+    done = threading.Event()
+
+    def worker():
+        db.get_courses()
+        opened.set()
+        traced.wait()
+        for _ in range(5):
+            db.conn.execute('SELECT 1')
+        done.set()
+
+    # The worker's connection exists before tracing starts
+    thread = threading.Thread(target=worker)
+    thread.start()
+    opened.wait()
+    trace_tools.reset()
+    trace_tools.enable()
+    traced.set()
+    done.wait()
+    thread.join()
+    assert statements() == 5
+
+    # A connection opened while tracing is enabled
+    thread = threading.Thread(target=lambda: db.conn.execute('SELECT 1'))
+    thread.start()
+    thread.join()
+    assert statements() == 6
+
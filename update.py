@@ -1,18 +1,27 @@
 import config
 import time
 import logging
-from golfsim import dg_tools as dg, pga_tools, db_tools
+import argparse
+from golfsim import dg_tools as dg, pga_tools, db_tools, fetch_tools, cache_tools, trace_tools, archive_tools
 
 log = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-api = dg.API()
+parser = argparse.ArgumentParser()
+parser.add_argument('--full', action='store_true', help='Refetch every player profile, ignoring sync state')
+args = parser.parse_args()
+if config.trace:
+    trace_tools.enable()
+
+cache = cache_tools.ResponseCache(cache_tools.DiskBackend(config.cache_dir), replay=config.offline)
+archive = archive_tools.ProfileArchive(config.archive_dir) if config.updateArchive else None
+api = dg.API(cache=cache, archive=archive)
 db = db_tools.DB_Interface(config.db_filename)
 
 t = time.perf_counter()
 log.info('Updating tournament info...')
 tourn = api.get_next_event(tour=config.tsg_tour)
-purse = pga_tools.get_purse_breakdown(config.pga_purse_url)
+purse = pga_tools.get_purse_breakdown(config.pga_purse_url, cache)
 db.update_sim_tournaments(db.simTournaments.get_df([
     tourn['event_name'],
     int(tourn['start_date'].replace('-', '')),
@@ -20,8 +29,11 @@ db.update_sim_tournaments(db.simTournaments.get_df([
     int(tourn['event_id']),
     config.cut_line,
     config.cut_round,
-    str(purse)
+    None  # purse, stored in Purses below
 ]))
+sim_tournament_id = db.get_sim_tournament_ids().get((int(tourn['event_id']), int(tourn['start_date'][:4])))
+if sim_tournament_id is not None and len(purse) > 0:
+    db.set_purse(sim_tournament_id, purse, config.pga_purse_url)
 log.info(f'Updating tournament info complete. ({time.perf_counter() - t}s)')
 
 t = time.perf_counter()
@@ -38,16 +50,34 @@ log.info('Updating Round History...')
 t = time.perf_counter()
 players = db.get_dg_pred()
 df_player_names = db.get_player_names()
-idx = 0
-for plr in players['dg_id']:
-    idx += 1
-    if plr in df_player_names['dg_id'].values:
-        name = df_player_names.loc[df_player_names['dg_id'] == plr]['player_name'].values[0]
-    else:
-        name = plr
-    log.info(f'Updating Round history for {name}. {len(players) - idx} remaining.')
-    num_rounds = db.update_player_rounds(api, plr)
-    log.info(f'Updated {num_rounds} rounds for {name}.')
-    time.sleep(config.updateWaitTime)
+names = dict(zip(df_player_names['dg_id'], df_player_names['player_name']))
+stale = db.plan_player_updates(players['dg_id'].values, api.get_schedule(config.updateScheduleTour)['schedule'],
+                               max_sync_age=config.updateMaxSyncAge, full=args.full)
+log.info(f'{len(stale)} of {len(players)} player profiles need updating.')
+fetcher = fetch_tools.ProfileFetcher(api, config.updateRate, config.updateBurst, config.updateWorkers,
+                                     config.updateMaxRetries, config.updateBackoff)
+remaining = len(stale)
+batch = []
+
+
+def write_batch():
+    for dg_id, n in db.add_player_profiles(batch).items():
+        log.info(f'Updated {n} rounds for {names.get(dg_id, dg_id)}.')
+    batch.clear()
+
+
+with trace_tools.span('update rounds', players=len(stale)):
+    for plr, profile, error in fetcher.fetch(stale):
+        remaining -= 1
+        if error is not None:
+            log.warning(f'Updating Round history for {names.get(plr, plr)} failed: {error}')
+            continue
+        batch.append((plr, profile))
+        if len(batch) >= config.updateIngestBatch:
+            write_batch()
+            log.info(f'{remaining} player profiles remaining.')
+    write_batch()
 log.info(f'Updating Round History Table complete. ({time.perf_counter() -t }s)')
 
+if config.trace:
+    trace_tools.save(config.trace_dir, 'update')